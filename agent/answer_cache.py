@@ -0,0 +1,218 @@
+# Caches answers to repeated caller questions so they skip embedding + completion
+import os
+import re
+import json
+import time
+import atexit
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from agent.config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_SAVE_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key"""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+class AnswerCache:
+    """
+    Bounded LRU + TTL cache of answers keyed on normalized question text.
+    Entries are tied to the index version they were answered against and
+    the whole cache is dropped when the knowledge base is rebuilt.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl=ANSWER_CACHE_TTL, similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._index_version = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saving = False
+        self._last_save = time.monotonic()
+        self._load()
+
+    @property
+    def similarity_enabled(self):
+        return self.similarity_threshold > 0
+
+    def _key(self, question, namespace):
+        return f"{namespace}:{normalize_question(question)}"
+
+    def _load(self):
+        """Load persisted entries from disk, ignoring a missing or corrupt file"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._index_version = data.get("index_version")
+            now = time.time()
+            for key, entry in data.get("entries", []):
+                if now - entry["created"] < self.ttl:
+                    self._entries[key] = entry
+            logger.info(f"Loaded {len(self._entries)} cached answers from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load answer cache {self.path}: {str(e)}")
+
+    def save(self):
+        """Persist entries to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "index_version": self._index_version,
+                "entries": list(self._entries.items()),
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not save answer cache {self.path}: {str(e)}")
+
+    def _save_in_background(self):
+        """Write the file on a short-lived thread, never on the caller's (often an event loop)"""
+        with self._lock:
+            if self._saving:
+                return
+            self._saving = True
+        
+        def run():
+            try:
+                self.save()
+            finally:
+                self._saving = False
+        
+        threading.Thread(target=run, name="answer-cache-save", daemon=True).start()
+
+    def _check_version(self, index_version):
+        """Drop every entry if the answers were produced against another index"""
+        if index_version != self._index_version:
+            if self._entries:
+                logger.info("Knowledge base changed, clearing answer cache")
+            self._entries.clear()
+            self._index_version = index_version
+            self._dirty = True
+
+    def _similar(self, namespace, embedding):
+        """Return the key of the most similar cached question above the threshold"""
+        prefix = f"{namespace}:"
+        keys = [key for key, entry in self._entries.items()
+                if key.startswith(prefix) and entry.get("embedding") is not None]
+        if not keys:
+            return None
+        matrix = np.asarray([self._entries[key]["embedding"] for key in keys], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return keys[best]
+        return None
+
+    def lookup(self, question, namespace="rag", index_version=None, embedding=None):
+        """Return a cached answer, matching by embedding similarity when an embedding is given"""
+        key = self._key(question, namespace)
+        with self._lock:
+            self._check_version(index_version)
+            entry = self._entries.get(key)
+            if entry is None and embedding is not None and self.similarity_enabled:
+                key = self._similar(namespace, embedding)
+                entry = self._entries.get(key) if key else None
+            if entry is not None and time.time() - entry["created"] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                # Only count a miss once the embedding match has been tried too
+                if embedding is not None or not self.similarity_enabled:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def store(self, question, answer, namespace="rag", index_version=None, embedding=None):
+        """Cache an answer, evicting the least recently used entry when full"""
+        key = self._key(question, namespace)
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            embedding = vector.tolist()
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[key] = {
+                "question": question,
+                "answer": answer,
+                "embedding": embedding,
+                "created": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            should_save = time.monotonic() - self._last_save >= ANSWER_CACHE_SAVE_INTERVAL
+        if should_save:
+            self._save_in_background()
+
+    def flush(self):
+        """Persist pending changes"""
+        if self._dirty:
+            self.save()
+
+    def clear(self):
+        """Remove every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.save()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """Return the process-wide answer cache, or None when caching is disabled"""
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+                atexit.register(_cache.flush)
+    return _cache
+
+def invalidate_answer_cache(path=ANSWER_CACHE_PATH):
+    """Discard cached answers after the knowledge base is rebuilt"""
+    if _cache is not None:
+        _cache.clear()
+    try:
+        os.remove(path)
+        logger.info(f"Invalidated answer cache {path}")
+    except FileNotFoundError:
+        pass
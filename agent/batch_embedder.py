@@ -0,0 +1,109 @@
+# Token-budgeted, concurrent embedding of knowledge base chunks during ingestion
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import tiktoken
+from agent.config import (
+    EMBED_BATCH_TOKENS, EMBED_MAX_WORKERS, EMBED_MAX_RETRIES, EMBED_RETRY_BASE_DELAY
+)
+
+logger = logging.getLogger(__name__)
+
+def get_encoding():
+    """Tokenizer used by the OpenAI embedding models"""
+    return tiktoken.get_encoding("cl100k_base")
+
+def token_batches(texts, max_tokens=EMBED_BATCH_TOKENS, encoding=None):
+    """
+    Group text indices into batches whose total token count stays under max_tokens.
+    A single text larger than the budget gets a batch of its own.
+    Returns a list of (indices, token count) tuples.
+    """
+    encoding = encoding or get_encoding()
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = len(encoding.encode(text, disallowed_special=()))
+        if current and current_tokens + tokens > max_tokens:
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+def is_rate_limit_error(error):
+    """True for 429 / rate-limit responses from OpenAI"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "rate_limit" in message
+
+def chroma_metadata(metadata):
+    """Keep only the scalar values Chroma can store"""
+    return {key: value for key, value in (metadata or {}).items() if isinstance(value, (str, int, float, bool))}
+
+def embed_with_retry(embeddings, texts, max_retries=EMBED_MAX_RETRIES, base_delay=EMBED_RETRY_BASE_DELAY):
+    """Embed a batch, backing off exponentially (with jitter) on rate limits; returns (vectors, retries)"""
+    retries = 0
+    while True:
+        try:
+            return embeddings.embed_documents(texts), retries
+        except Exception as e:
+            if retries >= max_retries or not is_rate_limit_error(e):
+                raise
+            delay = base_delay * (2 ** retries) * (0.5 + random.random())
+            retries += 1
+            logger.warning(f"Embedding rate limited, retry {retries}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+def embed_and_upsert(collection, pending, embeddings, max_workers=EMBED_MAX_WORKERS, max_tokens=EMBED_BATCH_TOKENS):
+    """
+    Embed pending {chunk_id: Document} in concurrent token-budgeted batches and
+    upsert each batch into a chromadb collection as soon as it completes. Chroma
+    writes stay on the calling thread, so only the network-bound embedding work
+    is parallel. Metadata values Chroma can't store (None, lists, dicts) are
+    dropped first. Returns a throughput report dict.
+    """
+    ids = list(pending)
+    docs = [pending[cid] for cid in ids]
+    texts = [doc.page_content for doc in docs]
+    batches = token_batches(texts, max_tokens)
+    
+    report = {"chunks": 0, "tokens": 0, "batches": len(batches), "retries": 0, "seconds": 0.0}
+    if not batches:
+        return report
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(embed_with_retry, embeddings, [texts[i] for i in indices]): (indices, tokens)
+            for indices, tokens in batches
+        }
+        for future in as_completed(futures):
+            indices, tokens = futures[future]
+            vectors, retries = future.result()
+            collection.upsert(
+                ids=[ids[i] for i in indices],
+                embeddings=vectors,
+                documents=[texts[i] for i in indices],
+                metadatas=[chroma_metadata(docs[i].metadata) for i in indices],
+            )
+            report["chunks"] += len(indices)
+            report["tokens"] += tokens
+            report["retries"] += retries
+            logger.info(f"Embedded {report['chunks']}/{len(ids)} chunks")
+    
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+def format_report(report):
+    """One-line throughput summary"""
+    seconds = report["seconds"] or 1e-9
+    return (
+        f"{report['chunks']} chunks / {report['tokens']} tokens in {report['batches']} batches, "
+        f"{report['seconds']:.2f}s ({report['chunks'] / seconds:.1f} chunks/s, "
+        f"{report['tokens'] / seconds:.0f} tokens/s), {report['retries']} retries"
+    )
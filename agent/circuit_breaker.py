@@ -0,0 +1,187 @@
+# Circuit breakers for the OpenAI-backed tiers (embeddings, chat, STT, TTS)
+import time
+import asyncio
+import threading
+import logging
+import openai
+from collections import deque
+from contextlib import contextmanager
+from agent.config import (
+    BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS, BREAKER_WINDOW_SECONDS,
+    BREAKER_OPEN_SECONDS, BREAKER_HALF_OPEN_CALLS
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+# Errors that say the upstream itself is unhealthy
+UPSTREAM_ERRORS = (
+    openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError,
+    ConnectionError, TimeoutError, asyncio.TimeoutError,
+)
+
+def is_upstream_failure(error):
+    """
+    True for transport errors, timeouts, 429 and 5xx. Client errors (bad
+    request, context length exceeded, bad key, unknown model) come from
+    the request, not the upstream, so they never count against a breaker.
+    """
+    if isinstance(error, UPSTREAM_ERRORS):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over a sliding time window.
+    Opens when at least min_calls outcomes in the window fail at failure_rate
+    or more; after open_seconds lets half_open_calls probes through, closing
+    on a successful probe and re-opening on a failed one.
+    """
+
+    def __init__(self, name, failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS,
+                 window_seconds=BREAKER_WINDOW_SECONDS, open_seconds=BREAKER_OPEN_SECONDS,
+                 half_open_calls=BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self._outcomes = deque()
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+            self.state = state
+            if state == OPEN:
+                self.times_opened += 1
+                self._opened_at = time.monotonic()
+            if state != HALF_OPEN:
+                self._probes = 0
+            if state == CLOSED:
+                self._outcomes.clear()
+
+    @property
+    def is_open(self):
+        """True while calls are being short-circuited"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def allow(self):
+        """Reserve a call slot, returning False if the call must be short-circuited"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def _release(self):
+        """Give back a half-open probe slot that produced no outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.calls += 1
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, False))
+            self._trim(now)
+            total = len(self._outcomes)
+            failed = sum(1 for _, ok in self._outcomes if not ok)
+            if total >= self.min_calls and failed / total >= self.failure_rate:
+                self._transition(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """
+        Wrap an upstream call: short-circuit when open, record the outcome
+        otherwise. Only upstream failures count; other errors propagate unrecorded.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            yield
+        except CircuitOpenError:
+            # A nested breaker short-circuited; this upstream wasn't called
+            self._release()
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                # The upstream answered; the request itself was bad
+                self._release()
+            raise
+        except BaseException:
+            # Cancelled or abandoned mid-call: no verdict either way
+            self._release()
+            raise
+        else:
+            self.record_success()
+
+    def metrics(self):
+        """Current state and counters"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name):
+    """Process-wide breaker for an upstream tier, e.g. "chat", "embeddings", "stt", "tts.openai" """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+def breaker_metrics():
+    """Metrics for every breaker created so far"""
+    return {name: breaker.metrics() for name, breaker in list(_breakers.items())}
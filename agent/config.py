@@ -10,9 +10,139 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
 # Vector database settings
 VECTOR_DB_PATH = "agent/db"
+VECTOR_COLLECTION_NAME = "langchain"  # LangChain's default, so existing stores keep working
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 
 # AI model settings
 DEFAULT_MODEL = "gpt-3.5-turbo"
-TEMPERATURE = 0.7
\ No newline at end of file
+TEMPERATURE = 0.7
+
+# Retrieval settings
+RETRIEVAL_K = 3  # Number of chunks retrieved per question
+# "chroma" searches the Chroma store; "numpy" searches a memory-mapped float32
+# matrix exported from it at ingestion (one page-cache copy shared by all workers)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+VECTOR_INDEX_MATRIX_PATH = "agent/db/vector_index.npy"
+VECTOR_INDEX_CHUNKS_PATH = "agent/db/vector_index.json"
+INDEX_RELOAD_CHECK_INTERVAL = float(os.getenv("INDEX_RELOAD_CHECK_INTERVAL", "5"))  # Seconds between index change checks
+
+# Phone answer settings
+# "single" retrieves context and writes the spoken reply in one completion,
+# "two_stage" keeps the original RAG answer + rewrite-for-phone round-trip
+PHONE_ANSWER_MODE = os.getenv("PHONE_ANSWER_MODE", "single")
+PHONE_MAX_TOKENS = 150
+
+# Answer cache settings
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_PATH = "agent/cache/answer_cache.json"
+ANSWER_CACHE_MAX_ENTRIES = 256
+ANSWER_CACHE_TTL = 24 * 60 * 60  # Seconds
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))  # Cosine threshold, 0 disables embedding match
+ANSWER_CACHE_SAVE_INTERVAL = 30  # Seconds between writes to disk
+
+# Embedding cache settings
+EMBEDDING_CACHE_PATH = "agent/cache/embeddings.sqlite3"
+
+# Knowledge base ingestion settings
+KNOWLEDGE_BASE_DIR = "agent/knowledge_base"
+KNOWLEDGE_BASE_EXTENSIONS = (".md", ".txt")
+INGEST_MANIFEST_PATH = "agent/db/ingest_manifest.json"
+
+# Ingestion embedding settings
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "4000"))  # Token budget per embedding request
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))  # Concurrent embedding requests
+EMBED_MAX_RETRIES = 5
+EMBED_RETRY_BASE_DELAY = 1.0  # Seconds, doubled on each rate-limited retry
+
+# Text-to-speech settings
+TTS_BACKEND = os.getenv("TTS_BACKEND", "auto")  # auto (ElevenLabs, then OpenAI), elevenlabs, openai or polly
+TTS_CACHE_DIR = "data/tts_cache"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_PLAYBACK = os.getenv("TTS_PLAYBACK", "false").lower() == "true"  # <Play> cached fixed prompts and sentence-streamed answers
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "")  # e.g. your ngrok HTTPS URL
+
+# Outbound HTTP client settings
+HTTP_TIMEOUTS = {  # Seconds per provider
+    "default": 30,
+    "audio_download": 30,
+    "elevenlabs": 20,
+    "openai": 30,
+    "polly": 10,
+}
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))  # Keep-alive connections per provider
+HTTP_KEEPALIVE_EXPIRY = 30  # Seconds an idle connection is kept
+# Provider endpoints; override to point at local stubs (see benchmarks/). OpenAI clients read OPENAI_BASE_URL themselves
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+POLLY_ENDPOINT_URL = os.getenv("POLLY_ENDPOINT_URL") or None
+
+# Speech-to-text settings
+STT_INPUT_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}  # Sent to Whisper as-is
+STT_BACKEND = os.getenv("STT_BACKEND", "openai")  # openai or local (offline Whisper)
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "4"))  # Transcriptions in flight per worker
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "32"))  # Waiting requests before new ones are rejected
+STT_MAX_RETRIES = 3
+STT_RETRY_BASE_DELAY = 0.5  # Seconds, doubled on each rate-limited retry
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+STT_PREPROCESS = os.getenv("STT_PREPROCESS", "true").lower() == "true"  # Trim silence and downsample before upload
+STT_SAMPLE_RATE = 16000  # Hz, what Whisper uses internally
+STT_UPLOAD_FORMAT = "mp3"  # Lossy speech encoding; a lossless upload is usually larger than the telephony MP3 it came from
+STT_UPLOAD_BITRATE = "32k"  # Plenty for mono 16 kHz speech
+STT_MIN_TRIM_SECONDS = 0.3  # Less silence than this is not worth re-encoding already compressed input
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = -40.0  # Frames quieter than this (dBFS) count as silence
+VAD_PADDING_MS = 200  # Speech padding kept on both sides
+
+# Temporary audio settings
+TEMP_AUDIO_DIR = "temp_audio"
+TEMP_AUDIO_MAX_AGE = 15 * 60  # Seconds before an abandoned temp file is swept
+TEMP_AUDIO_SWEEP_INTERVAL = 5 * 60  # Seconds between janitor sweeps
+
+# Lexical (BM25) retrieval settings
+LEXICAL_INDEX_PATH = "agent/db/bm25_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "false").lower() == "true"  # Fuse BM25 with vector results
+HYBRID_RRF_K = 60  # Reciprocal rank fusion constant
+LEXICAL_MIN_SCORE = 1.0  # Below this BM25 score the offline tier falls back to canned answers
+
+# Circuit breaker settings for OpenAI-backed tiers
+BREAKER_FAILURE_RATE = 0.5  # Open when this share of recent calls failed...
+BREAKER_MIN_CALLS = 5  # ...out of at least this many calls...
+BREAKER_WINDOW_SECONDS = 60  # ...within this window
+BREAKER_OPEN_SECONDS = 30  # Short-circuit for this long before probing again
+BREAKER_HALF_OPEN_CALLS = 1  # Probe calls allowed while half-open
+
+# Greeting pool settings
+# "pool" answers from pre-generated variants refreshed in the background, "live" makes a completion per call
+GREETING_MODE = os.getenv("GREETING_MODE", "pool")
+GREETING_LIVE_FALLBACK = os.getenv("GREETING_LIVE_FALLBACK", "false").lower() == "true"  # Live completion while the pool is empty
+GREETING_LANGUAGE = os.getenv("GREETING_LANGUAGE", "en")  # Language spoken to callers ("en" or "hi")
+GREETING_LANGUAGES = tuple(os.getenv("GREETING_LANGUAGES", GREETING_LANGUAGE).split(","))  # Languages kept in the pool
+GREETING_POOL_SIZE = 6  # Variants per language
+GREETING_REFRESH_INTERVAL = float(os.getenv("GREETING_REFRESH_INTERVAL", str(6 * 60 * 60)))  # Seconds
+GREETING_POOL_PATH = "agent/cache/greetings.json"
+GREETING_UTC_OFFSET_HOURS = float(os.getenv("GREETING_UTC_OFFSET_HOURS", "5.5"))  # Callers' local time, for "Good morning"
+
+# Per-call conversation settings
+# "memory" keeps state in-process, "sqlite" shares it between workers on one host, "redis" across hosts.
+# Multi-worker production servers switch to "sqlite" unless this is set explicitly (see start_exotel.py)
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")
+CONVERSATION_SQLITE_PATH = "agent/cache/conversations.sqlite3"
+CONVERSATION_REDIS_URL = os.getenv("CONVERSATION_REDIS_URL", "redis://localhost:6379/0")
+CONVERSATION_TTL = 30 * 60  # Seconds a call's state outlives its last turn
+CONVERSATION_MAX_CALLS = 1000  # In-process backend only
+CONVERSATION_MAX_TURNS = 3  # Recent question/answer pairs sent verbatim; older ones fold into the summary
+CONVERSATION_SUMMARY_MAX_CHARS = 600
+CONVERSATION_MAX_CHUNKS = 8  # Previously retrieved chunk IDs remembered per call
+
+# Server launch settings (start_exotel.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "development")  # "production" runs workers without the reloader
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))  # 0 sizes the pool to the CPU count
+SERVER_KEEPALIVE_TIMEOUT = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "15"))  # Seconds an idle connection stays open
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0"))  # Per worker; above it requests get 503, 0 disables
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))  # Seconds in-flight calls get to finish on SIGTERM
+WARM_UP_QUESTION = "What services does NextCore AI offer?"  # Retrieval probe run before serving
@@ -0,0 +1,253 @@
+# Per-call conversation state keyed by CallSid: recent turns, rolling summary and retrieved chunk IDs
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from agent.config import (
+    CONVERSATION_BACKEND, CONVERSATION_SQLITE_PATH, CONVERSATION_REDIS_URL, CONVERSATION_TTL,
+    CONVERSATION_MAX_CALLS, CONVERSATION_MAX_TURNS, CONVERSATION_SUMMARY_MAX_CHARS,
+    CONVERSATION_MAX_CHUNKS
+)
+from agent.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "conversation:"
+TERMINAL_CALL_STATUSES = {"completed", "busy", "failed", "no-answer", "canceled"}
+REFERRING_WORDS = {"that", "this", "those", "these", "them", "they", "more", "else", "same", "which"}
+# Words that ask about whatever was just discussed without naming a topic themselves
+FOLLOW_UP_WORDS = {
+    "about", "again", "also", "any", "charge", "charges", "cost", "costs", "detail", "details",
+    "example", "examples", "explain", "fee", "fees", "get", "include", "includes", "long", "many",
+    "mean", "much", "offer", "ok", "okay", "other", "please", "price", "prices", "pricing",
+    "provide", "rate", "rates", "really", "so", "take", "takes", "tell", "there", "time", "work", "works",
+}
+
+def first_sentence(text, max_chars=160):
+    """Leading sentence of an answer, for the rolling summary"""
+    text = " ".join(text.split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rsplit(" ", 1)[0] + "..."
+
+class Conversation:
+    """
+    State of one call. Recent turns are kept verbatim; older ones are folded
+    into a short extractive summary so the prompt stays bounded however long
+    the call runs.
+    """
+
+    def __init__(self, call_sid, turns=None, summary="", chunk_ids=None, updated=None):
+        self.call_sid = call_sid
+        self.turns = turns or []  # [[question, answer], ...], oldest first
+        self.summary = summary
+        self.chunk_ids = chunk_ids or []  # Most recent retrieval first
+        self.updated = updated or time.time()
+
+    @property
+    def has_history(self):
+        return bool(self.turns or self.summary)
+
+    def add_turn(self, question, answer, max_turns=CONVERSATION_MAX_TURNS):
+        """Append a turn, folding the oldest into the summary once over max_turns"""
+        self.turns.append([question, answer])
+        while len(self.turns) > max_turns:
+            old_question, old_answer = self.turns.pop(0)
+            self._summarize(old_question, old_answer)
+        self.updated = time.time()
+
+    def _summarize(self, question, answer, max_chars=CONVERSATION_SUMMARY_MAX_CHARS):
+        line = f"Caller asked: {question.strip()} We said: {first_sentence(answer)}"
+        summary = f"{self.summary} {line}".strip()
+        if len(summary) > max_chars:
+            # Drop the oldest material, cutting at a "Caller asked" boundary when possible
+            summary = summary[-max_chars:]
+            cut = summary.find("Caller asked:")
+            summary = summary[cut:] if cut > 0 else summary
+        self.summary = summary
+
+    def note_chunks(self, chunk_ids, max_chunks=CONVERSATION_MAX_CHUNKS):
+        """Remember the chunks retrieved for the latest turn"""
+        merged = list(chunk_ids) + [cid for cid in self.chunk_ids if cid not in chunk_ids]
+        self.chunk_ids = merged[:max_chunks]
+
+    def history_text(self):
+        """Compact history for the prompt: rolling summary plus recent turns"""
+        lines = []
+        if self.summary:
+            lines.append(f"Earlier: {self.summary}")
+        for question, answer in self.turns:
+            lines.append(f"Caller: {question}")
+            lines.append(f"Agent: {answer}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "call_sid": self.call_sid,
+            "turns": self.turns,
+            "summary": self.summary,
+            "chunk_ids": self.chunk_ids,
+            "updated": self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["call_sid"], data.get("turns"), data.get("summary", ""),
+                   data.get("chunk_ids"), data.get("updated"))
+
+def is_follow_up(question, lexical_index=None):
+    """
+    True when a question leans on earlier turns rather than naming a topic:
+    it has a referring word and nothing else in it is a topic term. For
+    "how much does that cost?" the tokens are [much, that, cost]; "that"
+    refers back and "much"/"cost" only ask about it, so the previous chunks
+    are reused. "and that Flutter app?" names a topic and gets a fresh
+    search. With the BM25 index only words it knows count as topic terms;
+    without it any word outside the follow-up vocabulary does.
+    """
+    tokens = tokenize(question)
+    if not any(token in REFERRING_WORDS for token in tokens):
+        return False
+    rest = [token for token in tokens if token not in REFERRING_WORDS and token not in FOLLOW_UP_WORDS]
+    if lexical_index is not None:
+        return not any(token in lexical_index.idf for token in rest)
+    return not rest
+
+class MemoryBackend:
+    """In-process key/value store with per-key expiry and an LRU bound"""
+
+    def __init__(self, max_entries=CONVERSATION_MAX_CALLS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ex if ex else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SQLiteBackend:
+    """
+    Local stand-in for Redis: the same get/set(ex=)/delete subset over a
+    SQLite table, so every worker on one host sees the same calls.
+    """
+
+    def __init__(self, path=CONVERSATION_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several worker processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ex=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, now + ex if ex else None)
+            )
+            self._conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._conn.commit()
+
+def create_backend(name=CONVERSATION_BACKEND):
+    """Build the configured backend ("memory", "sqlite" or "redis")"""
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CONVERSATION_BACKEND=redis requires the redis package (pip install redis)")
+        return redis.Redis.from_url(CONVERSATION_REDIS_URL)
+    if name != "memory":
+        logger.warning(f"Unknown conversation backend {name}, using memory")
+    return MemoryBackend()
+
+class ConversationStore:
+    """Load and save Conversations through any backend speaking get/set(ex=)/delete"""
+
+    def __init__(self, backend, ttl=CONVERSATION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def load(self, call_sid):
+        """The call's conversation, or a fresh one"""
+        try:
+            raw = self.backend.get(KEY_PREFIX + call_sid)
+            if raw is not None:
+                return Conversation.from_dict(json.loads(raw))
+        except Exception as e:
+            logger.warning(f"Could not load conversation {call_sid}: {str(e)}")
+        return Conversation(call_sid)
+
+    def save(self, conversation):
+        """Persist a conversation, extending its TTL"""
+        try:
+            self.backend.set(KEY_PREFIX + conversation.call_sid, json.dumps(conversation.to_dict()), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not save conversation {conversation.call_sid}: {str(e)}")
+
+    def end(self, call_sid):
+        """Forget a finished call"""
+        try:
+            self.backend.delete(KEY_PREFIX + call_sid)
+        except Exception as e:
+            logger.warning(f"Could not end conversation {call_sid}: {str(e)}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """Return the process-wide conversation store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore(create_backend())
+    return _store
+
+def end_call_if_finished(call_sid, call_status):
+    """Drop a call's state once the provider reports a terminal status"""
+    if call_sid and (call_status or "").lower() in TERMINAL_CALL_STATUSES:
+        get_conversation_store().end(call_sid)
+        return True
+    return False
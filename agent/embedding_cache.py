@@ -0,0 +1,140 @@
+# Content-hash keyed on-disk cache for OpenAI embeddings
+import os
+import sqlite3
+import hashlib
+import threading
+import logging
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from agent.config import EMBEDDING_CACHE_PATH
+from agent.circuit_breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingStore:
+    """SQLite table mapping content hashes to float32 embedding blobs"""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several worker processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys present in the store"""
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs"""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only calls the underlying model for unseen text.
+    OpenAI returns the same vector for a query and a document with identical
+    text, so both paths share one keyspace per model.
+    """
+
+    def __init__(self, underlying, store, namespace=None):
+        self.underlying = underlying
+        self.store = store
+        self.namespace = namespace or getattr(underlying, "model", type(underlying).__name__)
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _split(self, texts):
+        """Return (keys, cached vectors by key, indices of texts that need embedding)"""
+        keys = [self._key(text) for text in texts]
+        cached = self.store.get_many(list(set(keys)))
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        with self._counter_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, vectors):
+        """Store freshly computed vectors and return all vectors in input order"""
+        new_items = [(keys[i], vector) for i, vector in zip(missing, vectors)]
+        self.store.put_many(new_items)
+        cached.update(new_items)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts):
+        keys, cached, missing = self._split(texts)
+        vectors = self.underlying.embed_documents([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    def embed_query(self, text):
+        keys, cached, missing = self._split([text])
+        vectors = []
+        if missing:
+            with get_breaker("embeddings").guard():
+                vectors = [self.underlying.embed_query(text)]
+        return self._merge(keys, cached, missing, vectors)[0]
+
+    async def aembed_documents(self, texts):
+        keys, cached, missing = self._split(texts)
+        vectors = await self.underlying.aembed_documents([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    async def aembed_query(self, text):
+        keys, cached, missing = self._split([text])
+        vectors = []
+        if missing:
+            with get_breaker("embeddings").guard():
+                vectors = [await self.underlying.aembed_query(text)]
+        return self._merge(keys, cached, missing, vectors)[0]
+
+    def stats(self):
+        """Return hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """Return the process-wide cached OpenAI embedding function"""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(OpenAIEmbeddings(), EmbeddingStore())
+    return _embeddings
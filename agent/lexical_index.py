@@ -0,0 +1,150 @@
+# Offline BM25 index over the knowledge base chunks, used without network and for hybrid ranking
+import re
+import json
+import hashlib
+import math
+import os
+import logging
+from collections import Counter, defaultdict
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from agent.config import LEXICAL_INDEX_PATH, BM25_K1, BM25_B, HYBRID_RRF_K
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "our", "the", "to", "we", "what",
+    "with", "you", "your",
+}
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+def chunk_id(source, content):
+    """Stable chunk ID: identical text from the same file always maps to the same ID"""
+    return hashlib.sha256(f"{source}\0{content}".encode("utf-8")).hexdigest()
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts with a term -> [(doc, tf)] inverted index.
+    A query only touches the postings of its own terms.
+    """
+
+    def __init__(self, ids, texts, metadatas, postings, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n_docs = len(ids)
+        self.avg_length = sum(doc_lengths) / n_docs if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, ids, texts, metadatas=None):
+        """Index chunk texts"""
+        metadatas = metadatas or [{} for _ in ids]
+        postings = defaultdict(list)
+        doc_lengths = []
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_index, tf))
+        return cls(list(ids), list(texts), list(metadatas), dict(postings), doc_lengths)
+
+    def save(self, path=LEXICAL_INDEX_PATH):
+        """Persist the index atomically as JSON"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "ids": self.ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=LEXICAL_INDEX_PATH):
+        """Load a persisted index"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        postings = {term: [tuple(p) for p in docs] for term, docs in data["postings"].items()}
+        return cls(data["ids"], data["texts"], data["metadatas"], postings, data["doc_lengths"])
+
+    def search(self, query, k=3):
+        """Return up to k (doc index, score) pairs, best first"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, tf in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.avg_length or 1)
+                scores[doc_index] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def search_documents(self, query, k=3):
+        """Return up to k matching chunks as Documents with their BM25 score in metadata"""
+        return [
+            Document(page_content=self.texts[i], metadata={**self.metadatas[i], "id": self.ids[i], "bm25_score": score})
+            for i, score in self.search(query, k)
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+def build_lexical_index(vectorstore, path=LEXICAL_INDEX_PATH):
+    """Rebuild the BM25 index from every chunk currently in the vector store"""
+    data = vectorstore.get(include=["documents", "metadatas"])
+    index = BM25Index.build(data["ids"], data["documents"], data["metadatas"])
+    index.save(path)
+    logger.info(f"BM25 index built over {len(index)} chunks: {path}")
+    return index
+
+def load_lexical_index(path=LEXICAL_INDEX_PATH):
+    """Load the persisted BM25 index, or None if it hasn't been built"""
+    try:
+        return BM25Index.load(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load BM25 index {path}: {str(e)}")
+        return None
+
+def fuse_results(vector_docs, lexical_docs, k, rrf_k=HYBRID_RRF_K):
+    """Reciprocal rank fusion of vector and BM25 results, keyed on chunk text"""
+    scores = defaultdict(float)
+    docs = {}
+    for results in (vector_docs, lexical_docs):
+        for rank, doc in enumerate(results):
+            scores[doc.page_content] += 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(doc.page_content, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[text] for text in ranked]
+
+class HybridRetriever(BaseRetriever):
+    """Vector retriever whose results are fused with BM25 results"""
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 3
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        vector_docs = self.vector_retriever.get_relevant_documents(query)
+        lexical_docs = self.lexical_index.search_documents(query, self.k)
+        return fuse_results(vector_docs, lexical_docs, self.k)
@@ -1,10 +1,21 @@
-# Loads markdown files, splits into chunks, and stores embeddings in ChromaDB
+# Loads knowledge base files, splits into chunks, and stores embeddings in ChromaDB
 from langchain_community.document_loaders import TextLoader
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from agent.config import OPENAI_API_KEY, VECTOR_DB_PATH, CHUNK_SIZE, CHUNK_OVERLAP
+import chromadb
+from agent.config import (
+    OPENAI_API_KEY, VECTOR_DB_PATH, VECTOR_COLLECTION_NAME, CHUNK_SIZE, CHUNK_OVERLAP,
+    KNOWLEDGE_BASE_DIR, KNOWLEDGE_BASE_EXTENSIONS, INGEST_MANIFEST_PATH, LEXICAL_INDEX_PATH,
+    VECTOR_INDEX_MATRIX_PATH
+)
+from agent.answer_cache import invalidate_answer_cache
+from agent.embedding_cache import get_embeddings
+from agent.batch_embedder import embed_and_upsert, format_report
+from agent.lexical_index import build_lexical_index, chunk_id
+from agent.vector_index import build_vector_index
 import os
+import json
+import hashlib
 import logging
 
 # Setup logging
@@ -14,37 +25,137 @@ logger = logging.getLogger(__name__)
 # Set OpenAI API key
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-def load_knowledge_base():
-    """Load and process all knowledge base documents"""
+def create_splitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Text splitter shared by full and single-file ingestion"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+def scan_knowledge_base(knowledge_base_dir=KNOWLEDGE_BASE_DIR):
+    """Return every supported file under the knowledge base directory"""
+    paths = []
+    for root, _, files in os.walk(knowledge_base_dir):
+        for name in files:
+            if name.lower().endswith(KNOWLEDGE_BASE_EXTENSIONS):
+                paths.append(os.path.join(root, name).replace(os.sep, "/"))
+    return sorted(paths)
+
+def file_hash(file_path):
+    """SHA-256 of a file's bytes"""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_manifest(path=INGEST_MANIFEST_PATH):
+    """Load the per-file hash and chunk ID manifest from the last ingestion"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest, path=INGEST_MANIFEST_PATH):
+    """Persist the ingestion manifest atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def split_file(file_path, splitter=None):
+    """Load and chunk a single file, returning {chunk_id: Document} in file order"""
+    splitter = splitter or create_splitter()
+    documents = TextLoader(file_path, encoding="utf-8").load()
+    chunks = {}
+    for doc in splitter.split_documents(documents):
+        doc.metadata["source"] = file_path
+        chunks.setdefault(chunk_id(file_path, doc.page_content), doc)
+    return chunks
+
+def _plan_file(file_path, entry, existing_ids, splitter):
+    """
+    Work out what a file contributes to the index.
+    Returns (manifest entry, {chunk_id: Document} still to embed). Unchanged
+    files whose chunks are all present are skipped without re-splitting.
+    """
+    digest = file_hash(file_path)
+    if entry and entry["hash"] == digest and existing_ids.issuperset(entry["chunk_ids"]):
+        return entry, {}
+    
+    chunks = split_file(file_path, splitter)
+    pending = {cid: doc for cid, doc in chunks.items() if cid not in existing_ids}
+    return {"hash": digest, "chunk_ids": list(chunks)}, pending
+
+def _open_vectorstore():
+    """Open the persisted vector store with the cached embedding function"""
+    return Chroma(
+        collection_name=VECTOR_COLLECTION_NAME,
+        persist_directory=VECTOR_DB_PATH,
+        embedding_function=get_embeddings()
+    )
+
+def _open_collection():
+    """Public chromadb handle on the same collection, for writing precomputed embeddings"""
+    client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+    # No embedding function: vectors always come from the batch embedder
+    return client.get_or_create_collection(VECTOR_COLLECTION_NAME, embedding_function=None)
+
+def _apply_changes(vectorstore, pending, stale_ids):
+    """Delete stale chunks and upsert new ones under their stable IDs"""
+    if stale_ids:
+        vectorstore.delete(ids=sorted(stale_ids))
+    if pending:
+        report = embed_and_upsert(_open_collection(), pending, get_embeddings())
+        logger.info(f"Embedding throughput: {format_report(report)}")
+    if stale_ids or pending or not os.path.exists(LEXICAL_INDEX_PATH):
+        # Offline BM25 index over exactly the chunks in the vector store
+        build_lexical_index(vectorstore)
+    if stale_ids or pending or not os.path.exists(VECTOR_INDEX_MATRIX_PATH):
+        # Memory-mapped copy of the embeddings for RETRIEVAL_BACKEND=numpy
+        build_vector_index(vectorstore)
+    if stale_ids or pending:
+        vectorstore.persist()
+        # Cached answers were produced against the old index
+        invalidate_answer_cache()
+
+def load_knowledge_base(knowledge_base_dir=KNOWLEDGE_BASE_DIR):
+    """
+    Incrementally sync the vector store with the knowledge base directory.
+    Only added or changed chunks are embedded; chunks that no longer exist
+    (including duplicates left by older full rebuilds) are deleted.
+    """
     try:
-        # Load the services markdown file
-        loader = TextLoader("agent/knowledge_base/services.md", encoding="utf-8")
-        documents = loader.load()
+        paths = scan_knowledge_base(knowledge_base_dir)
+        logger.info(f"Found {len(paths)} knowledge base files")
         
-        logger.info(f"Loaded {len(documents)} documents")
+        vectorstore = _open_vectorstore()
+        existing_ids = set(vectorstore.get(include=[])["ids"])
+        manifest = load_manifest()
+        splitter = create_splitter()
         
-        # Split documents into chunks
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE, 
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        docs = splitter.split_documents(documents)
+        new_manifest = {}
+        pending = {}
+        for path in paths:
+            entry, file_pending = _plan_file(path, manifest.get(path), existing_ids, splitter)
+            new_manifest[path] = entry
+            pending.update(file_pending)
         
-        logger.info(f"Split into {len(docs)} chunks")
+        # Keep documents added individually from outside the directory while they still exist
+        for path, entry in manifest.items():
+            if path not in new_manifest and not path.startswith(knowledge_base_dir.rstrip("/") + "/") and os.path.exists(path):
+                new_manifest[path] = entry
         
-        # Create embeddings
-        embeddings = OpenAIEmbeddings()
+        wanted_ids = {cid for entry in new_manifest.values() for cid in entry["chunk_ids"]}
+        stale_ids = existing_ids - wanted_ids
         
-        # Create and persist vector store
-        vectorstore = Chroma.from_documents(
-            docs, 
-            embeddings, 
-            persist_directory=VECTOR_DB_PATH
-        )
-        vectorstore.persist()
+        logger.info(f"Index has {len(existing_ids)} chunks: embedding {len(pending)} new, deleting {len(stale_ids)} stale")
+        
+        _apply_changes(vectorstore, pending, stale_ids)
+        save_manifest(new_manifest)
         
-        logger.info("✅ Knowledge base embedded successfully!")
+        logger.info(f"Embedding cache: {get_embeddings().stats()}")
+        logger.info(f"✅ Knowledge base synced: {len(wanted_ids)} chunks")
         logger.info(f"Vector store saved to: {VECTOR_DB_PATH}")
         
         return vectorstore
@@ -54,31 +165,22 @@ def load_knowledge_base():
         raise
 
 def add_document(file_path):
-    """Add a single document to existing knowledge base"""
+    """Add or update a single document in the existing knowledge base"""
     try:
-        # Load existing vector store
-        embeddings = OpenAIEmbeddings()
-        vectorstore = Chroma(
-            persist_directory=VECTOR_DB_PATH,
-            embedding_function=embeddings
-        )
+        file_path = file_path.replace(os.sep, "/")
+        vectorstore = _open_vectorstore()
+        existing_ids = set(vectorstore.get(include=[])["ids"])
+        manifest = load_manifest()
         
-        # Load new document
-        loader = TextLoader(file_path, encoding="utf-8")
-        documents = loader.load()
+        old_entry = manifest.get(file_path)
+        entry, pending = _plan_file(file_path, old_entry, existing_ids, create_splitter())
+        stale_ids = set(old_entry["chunk_ids"]) - set(entry["chunk_ids"]) if old_entry else set()
         
-        # Split into chunks
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP
-        )
-        docs = splitter.split_documents(documents)
-        
-        # Add to existing vector store
-        vectorstore.add_documents(docs)
-        vectorstore.persist()
+        _apply_changes(vectorstore, pending, stale_ids)
+        manifest[file_path] = entry
+        save_manifest(manifest)
         
-        logger.info(f"Added {len(docs)} chunks from {file_path}")
+        logger.info(f"Added {len(pending)} chunks from {file_path}, removed {len(stale_ids)}")
         
     except Exception as e:
         logger.error(f"Error adding document {file_path}: {str(e)}")
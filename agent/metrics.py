@@ -0,0 +1,150 @@
+# In-process metrics (stage latency histograms, counters) rendered in Prometheus text format
+import math
+import time
+import bisect
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cache hits (milliseconds) to slow completions and TTS
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(labels):
+    """{"stage": "stt"} -> '{stage="stt"}'"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by label values"""
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]
+            yield f"{self.name}_sum", labels, series[-2]
+            yield f"{self.name}_count", labels, series[-1]
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+class CallbackMetric:
+    """
+    Metric whose samples are read at scrape time from a component's own
+    counters (e.g. a cache's stats()); fn returns [(labels, value)]
+    """
+
+    def __init__(self, name, help, type, fn):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        try:
+            for labels, value in self.fn():
+                yield self.name, labels, value
+        except Exception as e:
+            logger.warning(f"Metric {self.name} collection failed: {str(e)}")
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def register(metric):
+    """Add a metric to /metrics output (re-registering a name replaces it)"""
+    with _registry_lock:
+        _registry[:] = [m for m in _registry if m.name != metric.name]
+        _registry.append(metric)
+    return metric
+
+def render_metrics():
+    """Every registered metric in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = register(Histogram(
+    "voice_agent_stage_seconds",
+    "Latency of each call-handling stage (STT, embedding, vector search, LLM, TTS, whole turn)",
+    labelnames=("stage",)
+))
+
+FALLBACK_ANSWERS = register(Counter(
+    "voice_agent_fallback_answers_total",
+    "Turns answered by the offline tiers because the OpenAI path failed or its breaker was open",
+    labelnames=("path",)
+))
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+@contextmanager
+def stage_timer(stage):
+    """Record the wall time of a block (awaits included) under a stage label"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
@@ -5,11 +5,26 @@ try:
 except ImportError:
     # Fallback to the community version if langchain-chroma is not available
     from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.chains import RetrievalQA
+from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from agent.config import OPENAI_API_KEY, VECTOR_DB_PATH, DEFAULT_MODEL, TEMPERATURE
+from langchain.schema import SystemMessage, HumanMessage
+from langchain_core.documents import Document
+from agent.answer_cache import get_answer_cache
+from agent.embedding_cache import get_embeddings
+from agent.lexical_index import load_lexical_index, fuse_results, HybridRetriever, chunk_id
+from agent.vector_index import load_vector_index
+from agent.circuit_breaker import get_breaker
+from agent.metrics import stage_timer, observe_stage
+from agent.conversation_store import get_conversation_store, is_follow_up
+from agent.config import (
+    OPENAI_API_KEY, VECTOR_DB_PATH, VECTOR_COLLECTION_NAME, DEFAULT_MODEL, TEMPERATURE,
+    RETRIEVAL_K, INDEX_RELOAD_CHECK_INTERVAL, PHONE_MAX_TOKENS,
+    LEXICAL_INDEX_PATH, HYBRID_RETRIEVAL, RETRIEVAL_BACKEND, VECTOR_INDEX_MATRIX_PATH
+)
 import os
+import time
+import asyncio
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -32,48 +47,358 @@ Answer: """
     
     return PromptTemplate(template=template, input_variables=["context", "question"])
 
-def query_agent(question):
-    """Query the knowledge base and return a response"""
-    try:
-        # Initialize embeddings and vector store
-        embeddings = OpenAIEmbeddings()
+PHONE_SYSTEM_PROMPT = "You are a helpful customer service agent for NextCore AI. Provide clear, concise responses about our services. Always be professional and helpful. Keep responses under 80 words for phone calls."
+
+def create_phone_messages(caller_number, question, context, history=""):
+    """Build the single-completion prompt that answers a caller from retrieved context"""
+    history_block = f"""
+    Conversation so far:
+    {history}
+    """ if history else ""
+    prompt = f"""{history_block}
+    Customer {caller_number} said: "{question}"
+    
+    Here is the relevant information from NextCore AI's knowledge base:
+    {context}
+    
+    Please provide a conversational, helpful response that:
+    1. Addresses their question directly using only the information above
+    2. Mentions relevant NextCore AI services
+    3. Keeps it under 80 words for phone conversation
+    4. Sounds natural and professional
+    5. Asks if they need more information
+    If the information above does not cover the question, politely say so and offer to connect them with our team.
+    """
+    
+    return [SystemMessage(content=PHONE_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+
+def format_context(docs):
+    """"Stuff" retrieved chunks into one context string"""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def with_history(context, conversation):
+    """Prefix the call's compact history to the context for the RAG prompt"""
+    if conversation is None or not conversation.has_history:
+        return context
+    return f"Conversation so far:\n{conversation.history_text()}\n\n{context}"
+
+def document_chunk_id(doc):
+    """Stable chunk ID of a retrieved Document (same scheme as ingestion)"""
+    return doc.metadata.get("id") or chunk_id(doc.metadata.get("source", ""), doc.page_content)
+
+def index_fingerprint(persist_directory=VECTOR_DB_PATH):
+    """Return the latest modification time of the on-disk Chroma, BM25 and NumPy indexes, or None if missing"""
+    mtimes = []
+    for path in (os.path.join(persist_directory, "chroma.sqlite3"), LEXICAL_INDEX_PATH, VECTOR_INDEX_MATRIX_PATH):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes) if mtimes else None
+
+class QueryEngine:
+    """
+    Long-lived retrieval engine shared by every caller turn.
+    Embeddings, Chroma store, retriever, LLMs and prompt are built once and
+    swapped atomically on reload, so concurrent queries never see a half-built set.
+    Embedding calls go through the "embeddings" circuit breaker (inside
+    CachedEmbeddings) and completions through the "chat" breaker.
+    """
+
+    def __init__(self, persist_directory=VECTOR_DB_PATH):
+        self.persist_directory = persist_directory
+        self._lock = threading.RLock()
+        self._components = None
+        self._fingerprint = None
+        self._last_check = 0.0
+
+    def _build(self):
+        """Build all retrieval components from the index on disk"""
+        embeddings = get_embeddings()
         vectorstore = Chroma(
-            persist_directory=VECTOR_DB_PATH, 
+            collection_name=VECTOR_COLLECTION_NAME,
+            persist_directory=self.persist_directory,
             embedding_function=embeddings
         )
         
+        # Same interface as Chroma, searched in-process over a memory-mapped matrix
+        if RETRIEVAL_BACKEND == "numpy":
+            vector_index = load_vector_index(embeddings)
+            if vector_index is not None:
+                vectorstore = vector_index
+            else:
+                logger.warning("RETRIEVAL_BACKEND=numpy but no vector index on disk, using Chroma (run agent/load_documents.py)")
+        
         # Create retriever
         retriever = vectorstore.as_retriever(
             search_type="similarity",
-            search_kwargs={"k": 3}  # Retrieve top 3 most relevant documents
+            search_kwargs={"k": RETRIEVAL_K}
         )
         
+        # Offline BM25 index, fused with vector results when hybrid retrieval is on
+        lexical_index = load_lexical_index()
+        if HYBRID_RETRIEVAL and lexical_index is not None:
+            retriever = HybridRetriever(vector_retriever=retriever, lexical_index=lexical_index, k=RETRIEVAL_K)
+        
         # Initialize LLM
         llm = ChatOpenAI(
             model_name=DEFAULT_MODEL,
             temperature=TEMPERATURE
         )
         
-        # Create custom prompt
+        # Short-reply LLM for the single-completion phone pipeline
+        phone_llm = ChatOpenAI(
+            model_name=DEFAULT_MODEL,
+            temperature=TEMPERATURE,
+            max_tokens=PHONE_MAX_TOKENS
+        )
+        
         prompt = create_custom_prompt()
         
-        # Create QA chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=False,
-            chain_type_kwargs={"prompt": prompt}
-        )
+        return {
+            "embeddings": embeddings,
+            "vectorstore": vectorstore,
+            "retriever": retriever,
+            "lexical_index": lexical_index,
+            "llm": llm,
+            "phone_llm": phone_llm,
+            "prompt": prompt,
+        }
+
+    def load(self):
+        """Build the engine if it has not been built yet"""
+        with self._lock:
+            if self._components is None:
+                self._fingerprint = index_fingerprint(self.persist_directory)
+                self._components = self._build()
+                self._last_check = time.monotonic()
+                logger.info(f"Query engine loaded from {self.persist_directory}")
+        return self
+
+    def reload(self):
+        """Rebuild the engine against the current index on disk"""
+        with self._lock:
+            fingerprint = index_fingerprint(self.persist_directory)
+            self._components = self._build()
+            self._fingerprint = fingerprint
+            self._last_check = time.monotonic()
+            logger.info(f"Query engine reloaded from {self.persist_directory}")
+        return self
+
+    def reload_if_changed(self, force_check=False):
+        """Reload when the index on disk has changed since the last build"""
+        now = time.monotonic()
+        if not force_check and now - self._last_check < INDEX_RELOAD_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._last_check = now
+            if self._components is None:
+                return False
+            if index_fingerprint(self.persist_directory) == self._fingerprint:
+                return False
+            logger.info("Vector index changed on disk, reloading query engine")
+            self.reload()
+            return True
+
+    @property
+    def is_loaded(self):
+        return self._components is not None
+
+    @property
+    def index_version(self):
+        """Fingerprint of the index the current components were built from"""
+        return self._fingerprint
+
+    @property
+    def components(self):
+        """Current component set, building it on first use"""
+        components = self._components
+        if components is None:
+            components = self.load()._components
+        return components
+
+    def query(self, question):
+        """Answer a question from the knowledge base, raising on failure"""
+        components = self.ensure_fresh()
+        with stage_timer("retrieval"):
+            docs = components["retriever"].get_relevant_documents(question)
+        
+        # "Stuff" the retrieved chunks into the prompt
+        context = format_context(docs)
+        prompt_text = components["prompt"].format(context=context, question=question)
+        with stage_timer("llm"), get_breaker("chat").guard():
+            message = components["llm"].invoke(prompt_text)
+        return message.content
+
+    def ensure_fresh(self):
+        """
+        Reload if the index on disk has changed (checked at most every
+        INDEX_RELOAD_CHECK_INTERVAL) and return the current component set
+        """
+        self.reload_if_changed()
+        return self.components
+
+    def _chunks_by_id(self, components, chunk_ids):
+        """Fetch previously retrieved chunks from the local store without embedding anything"""
+        data = components["vectorstore"].get(ids=list(chunk_ids), include=["documents", "metadatas"])
+        found = {
+            cid: Document(page_content=text, metadata={**(metadata or {}), "id": cid})
+            for cid, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+        }
+        return [found[cid] for cid in chunk_ids if cid in found]
+
+    async def _aretrieve(self, question, conversation=None):
+        """
+        Return the current components and the chunks relevant to a question.
+        The query is embedded with the async OpenAI client; the Chroma lookup
+        is synchronous SQLite work, so it runs in the default executor.
+        A follow-up turn in a known call ("how much does that cost?") reuses
+        the chunks retrieved earlier in the call instead of searching again.
+        """
+        loop = asyncio.get_running_loop()
+        components = await loop.run_in_executor(None, self.ensure_fresh)
         
-        # Get response
-        result = qa_chain.invoke({"query": question})
+        if conversation is not None and conversation.chunk_ids and is_follow_up(question, components["lexical_index"]):
+            with stage_timer("chunk_reuse"):
+                docs = await loop.run_in_executor(None, self._chunks_by_id, components, conversation.chunk_ids[:RETRIEVAL_K])
+            if docs:
+                logger.info(f"Follow-up turn, reusing {len(docs)} chunks from call {conversation.call_sid}")
+                return components, docs
         
-        # Extract the answer from the result
-        if isinstance(result, dict) and "result" in result:
-            answer = result["result"]
-        else:
-            answer = str(result)
+        with stage_timer("embedding"):
+            query_embedding = await components["embeddings"].aembed_query(question)
+        with stage_timer("vector_search"):
+            docs = await loop.run_in_executor(
+                None,
+                lambda: components["vectorstore"].similarity_search_by_vector(query_embedding, k=RETRIEVAL_K)
+            )
+        if HYBRID_RETRIEVAL and components["lexical_index"] is not None:
+            docs = fuse_results(docs, components["lexical_index"].search_documents(question, RETRIEVAL_K), RETRIEVAL_K)
+        
+        if conversation is not None:
+            conversation.note_chunks([document_chunk_id(doc) for doc in docs])
+        return components, docs
+
+    async def aquery(self, question, conversation=None):
+        """Answer a question without blocking the event loop, raising on failure"""
+        components, docs = await self._aretrieve(question, conversation)
+        context = with_history(format_context(docs), conversation)
+        prompt_text = components["prompt"].format(context=context, question=question)
+        with stage_timer("llm"), get_breaker("chat").guard():
+            message = await components["llm"].ainvoke(prompt_text)
+        return message.content
+
+    def _phone_messages(self, question, caller_number, docs, conversation):
+        history = conversation.history_text() if conversation is not None else ""
+        return create_phone_messages(caller_number, question, format_context(docs), history)
+
+    async def aphone_answer(self, question, caller_number="Unknown", conversation=None):
+        """Retrieve context and write the short spoken reply in a single completion"""
+        components, docs = await self._aretrieve(question, conversation)
+        messages = self._phone_messages(question, caller_number, docs, conversation)
+        with stage_timer("llm"), get_breaker("chat").guard():
+            message = await components["phone_llm"].ainvoke(messages)
+        return message.content.strip()
+
+    async def astream_phone_answer(self, question, caller_number="Unknown", conversation=None):
+        """Like aphone_answer, but yield token deltas as the completion streams in"""
+        components, docs = await self._aretrieve(question, conversation)
+        messages = self._phone_messages(question, caller_number, docs, conversation)
+        started = time.perf_counter()
+        first = True
+        with stage_timer("llm"), get_breaker("chat").guard():
+            async for chunk in components["phone_llm"].astream(messages):
+                if chunk.content:
+                    if first:
+                        observe_stage("llm_first_token", time.perf_counter() - started)
+                        first = False
+                    yield chunk.content
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_query_engine():
+    """Return the process-wide query engine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = QueryEngine()
+    return _engine
+
+def warm_up_query_engine(probe_question=None):
+    """
+    Build the process-wide query engine ahead of the first call.
+    A probe question also runs one retrieval, which loads the vector index
+    into memory and leaves the probe's embedding in the on-disk cache.
+    """
+    engine = get_query_engine().load()
+    if probe_question:
+        try:
+            engine.components["retriever"].get_relevant_documents(probe_question)
+        except Exception as e:
+            logger.warning(f"Warm-up retrieval failed: {str(e)}")
+    return engine
+
+def error_response(error):
+    """Map a query failure to a caller-friendly apology"""
+    # Provide specific error responses based on error type
+    error_message = str(error).lower()
+    
+    if "quota" in error_message or "429" in error_message:
+        return "I apologize, but our AI service is temporarily unavailable due to high demand. Please try again in a few minutes or contact our support team directly at nextcoreai.in@gmail.com or +91 6202579799."
+    elif "timeout" in error_message or "connection" in error_message:
+        return "I'm experiencing connectivity issues right now. Please try again in a moment or contact our support team at nextcoreai.in@gmail.com or +91 6202579799."
+    else:
+        return "I apologize, but I'm experiencing technical difficulties right now. Please try again later or contact our support team directly at nextcoreai.in@gmail.com or +91 6202579799."
+
+def _cached_answer(engine, question, namespace):
+    """Look a question up in the answer cache, returning (answer, question embedding)"""
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    # Pick up a re-ingested index first, so hits never outlive the answers' index version
+    engine.ensure_fresh()
+    answer = cache.lookup(question, namespace, engine.index_version)
+    embedding = None
+    if answer is None and cache.similarity_enabled:
+        embedding = engine.components["embeddings"].embed_query(question)
+        answer = cache.lookup(question, namespace, engine.index_version, embedding=embedding)
+    return answer, embedding
+
+async def _acached_answer(engine, question, namespace):
+    """Async variant of _cached_answer"""
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    await asyncio.get_running_loop().run_in_executor(None, engine.ensure_fresh)
+    answer = cache.lookup(question, namespace, engine.index_version)
+    embedding = None
+    if answer is None and cache.similarity_enabled:
+        embedding = await engine.components["embeddings"].aembed_query(question)
+        answer = cache.lookup(question, namespace, engine.index_version, embedding=embedding)
+    return answer, embedding
+
+def _store_answer(engine, question, answer, namespace, embedding):
+    """Remember a successful answer for repeated questions"""
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.store(question, answer, namespace, engine.index_version, embedding=embedding)
+
+def query_agent(question, raise_errors=False):
+    """
+    Query the knowledge base and return a response
+    Failures become an apology string unless raise_errors is set
+    """
+    try:
+        engine = get_query_engine()
+        answer, embedding = _cached_answer(engine, question, "rag")
+        if answer is not None:
+            logger.info(f"Answer cache hit: {question}")
+            return answer
+        
+        answer = engine.query(question)
+        _store_answer(engine, question, answer, "rag", embedding)
             
         logger.info(f"Question: {question}")
         logger.info(f"Answer: {answer}")
@@ -82,16 +407,128 @@ def query_agent(question):
         
     except Exception as e:
         logger.error(f"Error in query_agent: {str(e)}")
+        if raise_errors:
+            raise
+        return error_response(e)
+
+async def _aload_conversation(call_sid):
+    """The call's conversation state, or None outside a call"""
+    if not call_sid:
+        return None
+    return await asyncio.get_running_loop().run_in_executor(None, get_conversation_store().load, call_sid)
+
+async def _asave_turn(conversation, question, answer):
+    """Record a completed turn in the call's conversation state"""
+    if conversation is None:
+        return
+    conversation.add_turn(question, answer)
+    await asyncio.get_running_loop().run_in_executor(None, get_conversation_store().save, conversation)
+
+async def _acached_turn_answer(engine, question, namespace, conversation):
+    """
+    Answer-cache lookup for a turn. Once a call has history the answer depends
+    on it, so such turns neither read nor populate the shared answer cache.
+    """
+    if conversation is not None and conversation.has_history:
+        return None, None
+    return await _acached_answer(engine, question, namespace)
+
+def _cacheable(conversation):
+    return conversation is None or not conversation.has_history
+
+async def aquery_agent(question, raise_errors=False, call_sid=None):
+    """
+    Async variant of query_agent for use inside request handlers
+    With a call_sid, earlier turns of the same call inform the answer
+    """
+    try:
+        engine = get_query_engine()
+        conversation = await _aload_conversation(call_sid)
+        answer, embedding = await _acached_turn_answer(engine, question, "rag", conversation)
+        if answer is not None:
+            logger.info(f"Answer cache hit: {question}")
+        else:
+            answer = await engine.aquery(question, conversation)
+            if _cacheable(conversation):
+                _store_answer(engine, question, answer, "rag", embedding)
         
-        # Provide specific error responses based on error type
-        error_message = str(e).lower()
+        await _asave_turn(conversation, question, answer)
+        logger.info(f"Question: {question}")
+        logger.info(f"Answer: {answer}")
+        
+        return answer
         
-        if "quota" in error_message or "429" in error_message:
-            return "I apologize, but our AI service is temporarily unavailable due to high demand. Please try again in a few minutes or contact our support team directly at nextcoreai.in@gmail.com or +91 6202579799."
-        elif "timeout" in error_message or "connection" in error_message:
-            return "I'm experiencing connectivity issues right now. Please try again in a moment or contact our support team at nextcoreai.in@gmail.com or +91 6202579799."
+    except Exception as e:
+        logger.error(f"Error in aquery_agent: {str(e)}")
+        if raise_errors:
+            raise
+        return error_response(e)
+
+async def aphone_answer(question, caller_number="Unknown", raise_errors=False, call_sid=None):
+    """
+    Answer a caller in phone style (under 80 words) with one retrieval-augmented completion
+    With a call_sid, earlier turns of the same call inform the answer
+    """
+    try:
+        engine = get_query_engine()
+        conversation = await _aload_conversation(call_sid)
+        answer, embedding = await _acached_turn_answer(engine, question, "phone", conversation)
+        if answer is not None:
+            logger.info(f"Answer cache hit: {question}")
         else:
-            return "I apologize, but I'm experiencing technical difficulties right now. Please try again later or contact our support team directly at nextcoreai.in@gmail.com or +91 6202579799."
+            answer = await engine.aphone_answer(question, caller_number, conversation)
+            if _cacheable(conversation):
+                _store_answer(engine, question, answer, "phone", embedding)
+        
+        await _asave_turn(conversation, question, answer)
+        logger.info(f"Phone question: {question}")
+        logger.info(f"Phone answer: {answer}")
+        
+        return answer
+        
+    except Exception as e:
+        logger.error(f"Error in aphone_answer: {str(e)}")
+        if raise_errors:
+            raise
+        return error_response(e)
+
+async def astream_phone_answer(question, caller_number="Unknown", call_sid=None, raise_errors=False):
+    """
+    Stream a phone-style answer as token deltas.
+    Cached answers are yielded in one piece; a fully streamed answer is cached
+    afterwards. A failure before anything was yielded is raised when
+    raise_errors is set (so callers can answer offline) and otherwise
+    yields the apology text.
+    """
+    parts = []
+    try:
+        engine = get_query_engine()
+        conversation = await _aload_conversation(call_sid)
+        answer, embedding = await _acached_turn_answer(engine, question, "phone", conversation)
+        if answer is not None:
+            logger.info(f"Answer cache hit: {question}")
+            yield answer
+            await _asave_turn(conversation, question, answer)
+            return
+        
+        async for delta in engine.astream_phone_answer(question, caller_number, conversation):
+            parts.append(delta)
+            yield delta
+        
+        answer = "".join(parts).strip()
+        if _cacheable(conversation):
+            _store_answer(engine, question, answer, "phone", embedding)
+        await _asave_turn(conversation, question, answer)
+        logger.info(f"Phone question: {question}")
+        logger.info(f"Phone answer: {answer}")
+        
+    except Exception as e:
+        logger.error(f"Error in astream_phone_answer: {str(e)}")
+        # Don't repeat an apology after part of the answer was already spoken
+        if not parts:
+            if raise_errors:
+                raise
+            yield error_response(e)
 
 # Example test
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+# In-process vector index: a memory-mapped float32 matrix of the Chroma embeddings searched with NumPy
+import os
+import json
+import logging
+from typing import Any, Iterable, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from agent.config import VECTOR_INDEX_MATRIX_PATH, VECTOR_INDEX_CHUNKS_PATH
+
+logger = logging.getLogger(__name__)
+
+def normalize_rows(matrix):
+    """L2-normalize each row in place (all-zero rows are left as they are)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+class NumpyVectorIndex(VectorStore):
+    """
+    Read-only vector store over the chunk embeddings exported from Chroma.
+    Rows are unit vectors, so cosine top-k is one matrix-vector product
+    plus argpartition. The matrix is memory-mapped: every worker process
+    shares the same page-cache pages instead of holding its own copy.
+    Implements the parts of the Chroma interface the query engine uses
+    (as_retriever, similarity_search_by_vector, get).
+    """
+
+    def __init__(self, matrix, ids, texts, metadatas, embedding=None):
+        if matrix.shape[0] != len(ids):
+            raise ValueError(f"Vector index has {matrix.shape[0]} rows for {len(ids)} chunks")
+        self.matrix = matrix
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self._embedding = embedding
+        self._positions = {cid: i for i, cid in enumerate(ids)}
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        """Not supported: the index is read-only and rebuilt by build_vector_index at ingestion"""
+        raise NotImplementedError(
+            "NumpyVectorIndex is read-only; add the texts to Chroma and re-run ingestion "
+            "(agent/load_documents.py), which rebuilds it with build_vector_index"
+        )
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        """Not supported: the index is read-only and rebuilt by build_vector_index at ingestion"""
+        raise NotImplementedError(
+            "NumpyVectorIndex is not built from raw texts; ingestion exports it from Chroma with "
+            "build_vector_index (use NumpyVectorIndex.from_chroma for an in-memory copy)"
+        )
+
+    @classmethod
+    def from_chroma(cls, vectorstore, embedding=None):
+        """In-memory index over every chunk currently in a Chroma store"""
+        data = vectorstore.get(include=["documents", "metadatas", "embeddings"])
+        if data["ids"]:
+            matrix = np.ascontiguousarray(np.asarray(data["embeddings"], dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return cls(normalize_rows(matrix), data["ids"], data["documents"], data["metadatas"], embedding)
+
+    def _document(self, i):
+        return Document(page_content=self.texts[i], metadata={**(self.metadatas[i] or {}), "id": self.ids[i]})
+
+    def top_k(self, embedding, k=4):
+        """Row indices and cosine scores of the k nearest chunks, best first"""
+        n = len(self.ids)
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.matrix @ query
+        # argpartition is O(n); only the k winners get sorted
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        top, scores = self.top_k(embedding, k)
+        return [(self._document(i), float(score)) for i, score in zip(top, scores)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        top, _ = self.top_k(embedding, k)
+        return [self._document(i) for i in top]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        """Chroma-style get: {"ids", "documents"?, "metadatas"?} for the given (or all) IDs"""
+        positions = range(len(self.ids)) if ids is None else [self._positions[cid] for cid in ids if cid in self._positions]
+        data = {"ids": [self.ids[i] for i in positions]}
+        if "documents" in include:
+            data["documents"] = [self.texts[i] for i in positions]
+        if "metadatas" in include:
+            data["metadatas"] = [self.metadatas[i] for i in positions]
+        return data
+
+    def __len__(self):
+        return len(self.ids)
+
+def build_vector_index(vectorstore, matrix_path=VECTOR_INDEX_MATRIX_PATH, chunks_path=VECTOR_INDEX_CHUNKS_PATH):
+    """Export every chunk in the Chroma store to a normalized float32 .npy matrix plus a JSON sidecar"""
+    index = NumpyVectorIndex.from_chroma(vectorstore)
+
+    os.makedirs(os.path.dirname(chunks_path) or ".", exist_ok=True)
+    tmp_path = f"{chunks_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"ids": index.ids, "texts": index.texts, "metadatas": index.metadatas}, f)
+    os.replace(tmp_path, chunks_path)
+    # Matrix last: its mtime is what tells running engines to reload
+    tmp_path = f"{matrix_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, index.matrix)
+    os.replace(tmp_path, matrix_path)
+
+    logger.info(f"Vector index built over {len(index)} chunks: {matrix_path}")
+    return index
+
+def load_vector_index(embedding=None, matrix_path=VECTOR_INDEX_MATRIX_PATH, chunks_path=VECTOR_INDEX_CHUNKS_PATH):
+    """Memory-map the exported index, or None if it hasn't been built"""
+    try:
+        matrix = np.load(matrix_path, mmap_mode="r")
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        return NumpyVectorIndex(matrix, chunks["ids"], chunks["texts"], chunks["metadatas"], embedding)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load vector index {matrix_path}: {str(e)}")
+        return None
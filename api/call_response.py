@@ -1,20 +1,14 @@
 # call_response.py
-import openai
-from voice.audio_utils import download_audio, convert_mp3_to_wav, clean_temp_audio
-from agent.query_agent import query_agent
-import os
-
-openai.api_key = os.getenv("OPENAI_API_KEY")  # Env var से key लो
+from voice.speech_to_text import transcribe_from_url, atranscribe_from_url
+from agent.query_agent import query_agent, aquery_agent
 
 def transcribe_audio(audio_url):
-    mp3_path = download_audio(audio_url)
-    wav_path = convert_mp3_to_wav(mp3_path)
-    
-    with open(wav_path, "rb") as f:
-        transcript = openai.Audio.transcribe("whisper-1", f)
-    
-    clean_temp_audio()
-    return transcript["text"]
+    # Download and transcribe in memory - no temp files
+    return transcribe_from_url(audio_url)
+
+async def atranscribe_audio(audio_url):
+    # Bounded-concurrency async STT for use inside request handlers
+    return await atranscribe_from_url(audio_url)
 
 def generate_response(user_message, system_prompt=None):
     # Use the vector-based query agent for better responses
@@ -23,6 +17,14 @@ def generate_response(user_message, system_prompt=None):
     else:
         return "I'm sorry, I didn't understand that. Could you please repeat your question?"
 
+async def agenerate_response(user_message, system_prompt=None, call_sid=None):
+    # Async variant used by the webhook handlers so they don't block the event loop;
+    # call_sid ties turns of the same call together
+    if user_message:
+        return await aquery_agent(user_message, call_sid=call_sid)
+    else:
+        return "I'm sorry, I didn't understand that. Could you please repeat your question?"
+
 def handle_call(audio_url):
     print("🔊 Transcribing call...")
     user_text = transcribe_audio(audio_url)
@@ -2,15 +2,33 @@
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import Response
 import logging
-from api.fallback_agent import query_agent
-from openai import AsyncOpenAI
-from agent.config import OPENAI_API_KEY
+from api.fallback_agent import aquery_agent, aphone_query_agent, offline_answer
+from agent.config import (
+    PHONE_ANSWER_MODE, GREETING_MODE, GREETING_LIVE_FALLBACK, GREETING_LANGUAGE, TTS_PLAYBACK, PUBLIC_BASE_URL
+)
+from api.greeting_pool import get_greeting_pool, fallback_greeting, FALLBACK_GREETINGS
+from voice.text_to_speech import stream_clip_url
+from api.tts_routes import speech_xml, play_xml
+from voice.streaming_tts import speak_phone_answer
+from voice.http_clients import get_async_openai_client
+from agent.circuit_breaker import get_breaker, CircuitOpenError
+from agent.conversation_store import end_call_if_finished
+from agent.metrics import stage_timer, FALLBACK_ANSWERS
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Fixed phrases spoken on every call; pre-warmed into the TTS cache at startup
+GATHER_PROMPT = "Please tell me how I can help you with NextCore AI services."
+GOODBYE_MESSAGE = "Thank you for calling NextCore AI. For more information, contact us at nextcoreai.in@gmail.com. Have a great day!"
+DIGIT_RESPONSES = {
+    "1": "Great! You've chosen to speak with our AI agent. Please tell me about your requirements for NextCore AI services - whether it's AI automation, web development, mobile apps, or cloud solutions.",
+    "2": "Thank you for choosing to leave a message. Please speak after the beep and tell us about your requirements. We'll get back to you within 24 hours.",
+    "0": "Connecting you to our support team. Please hold on while we transfer your call.",
+}
+FALLBACK_GREETING = FALLBACK_GREETINGS["en"]
+EXOTEL_VOICE = "woman"
+FIXED_PHRASES = [GATHER_PROMPT, GOODBYE_MESSAGE, fallback_greeting(GREETING_LANGUAGE), *DIGIT_RESPONSES.values()]
 
 @router.post("/exotel-voice-webhook")
 @router.get("/exotel-voice-webhook")
@@ -33,7 +51,8 @@ async def handle_exotel_call(request: Request):
             logger.info(f"All query params: {query_params}")
             
             # Generate initial greeting for GET request
-            ai_response = await generate_greeting(caller_number)
+            with stage_timer("greeting"):
+                ai_response = await generate_greeting(caller_number)
             exotel_response = create_exotel_response(ai_response)
             
             logger.info(f"Sending XML response for GET request: {len(exotel_response)} chars")
@@ -57,11 +76,21 @@ async def handle_exotel_call(request: Request):
             
             logger.info(f"POST request call - From: {caller_number}, CallSid: {call_sid}, Speech: '{speech_result}', Digits: {digits}, Status: {call_status}")
             
+            if end_call_if_finished(call_sid, call_status):
+                # Status callback for a finished call: drop its conversation state
+                return Response(content='<?xml version="1.0" encoding="UTF-8"?>\n<Response></Response>', media_type="application/xml")
+            
             # Generate AI response based on input
             if speech_result and speech_result.strip() and speech_result.strip().lower() not in ["", "null", "undefined"]:
                 # Customer spoke something - generate contextual response
                 logger.info(f"Processing speech: '{speech_result}'")
-                ai_response = await generate_ai_response(caller_number, speech_result)
+                if streams_answer_audio():
+                    with stage_timer("answer"):
+                        spoken = await generate_spoken_answer(caller_number, speech_result, call_sid)
+                    exotel_response = create_exotel_response("", spoken)
+                    return Response(content=exotel_response, media_type="application/xml")
+                with stage_timer("answer"):
+                    ai_response = await generate_ai_response(caller_number, speech_result, call_sid)
             elif digits and digits.strip():
                 # Customer pressed digits
                 logger.info(f"Processing digits: {digits}")
@@ -69,7 +98,8 @@ async def handle_exotel_call(request: Request):
             else:
                 # Initial greeting or no speech detected
                 logger.info("Generating initial greeting for POST")
-                ai_response = await generate_greeting(caller_number)
+                with stage_timer("greeting"):
+                    ai_response = await generate_greeting(caller_number)
             
             # Create Exotel response XML
             exotel_response = create_exotel_response(ai_response)
@@ -91,41 +121,99 @@ async def handle_exotel_call(request: Request):
         )
         return Response(content=fallback_response, media_type="application/xml")
 
-async def generate_greeting(caller_number: str) -> str:
-    """Generate personalized greeting for the caller"""
+async def generate_greeting(caller_number: str, language: str = GREETING_LANGUAGE) -> str:
+    """
+    Greeting for the caller: a pooled variant in constant time when GREETING_MODE is "pool",
+    otherwise (or while the pool is empty, with GREETING_LIVE_FALLBACK) a live completion
+    """
+    if GREETING_MODE == "pool":
+        greeting = get_greeting_pool().pick(language)
+        if greeting:
+            return greeting
+        if not GREETING_LIVE_FALLBACK:
+            return fallback_greeting(language)
     
-    # English greeting prompt
-    prompt = f"A customer with number {caller_number} just called NextCore AI. Greet them politely and ask how we can assist with NextCore AI services. Keep it brief and professional."
+    return await generate_live_greeting(caller_number, language)
+
+async def generate_live_greeting(caller_number: str, language: str = GREETING_LANGUAGE) -> str:
+    """Generate personalized greeting for the caller with a live completion"""
     
-    # Hindi greeting option (uncomment if needed)
-    # prompt = f"Ek customer {caller_number} number se NextCore AI ko call kar raha hai. Use Hindi me greet karo aur NextCore AI services ke baare me kaise help kar sakte hain ye poocho. Brief aur professional rakhna."
+    if language == "hi":
+        prompt = f"Ek customer {caller_number} number se NextCore AI ko call kar raha hai. Use Hindi me greet karo aur NextCore AI services ke baare me kaise help kar sakte hain ye poocho. Brief aur professional rakhna."
+    else:
+        prompt = f"A customer with number {caller_number} just called NextCore AI. Greet them politely and ask how we can assist with NextCore AI services. Keep it brief and professional."
     
     try:
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a professional customer service representative for NextCore AI, a Bangalore-based digital transformation company. Be warm, helpful, and concise. Respond in under 50 words."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=100,
-            temperature=0.7
-        )
+        with stage_timer("llm_greeting"), get_breaker("chat").guard():
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {
+                        "role": "system", 
+                        "content": "You are a professional customer service representative for NextCore AI, a Bangalore-based digital transformation company. Be warm, helpful, and concise. Respond in under 50 words."
+                    },
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=100,
+                temperature=0.7
+            )
         
         return response.choices[0].message.content.strip()
         
     except Exception as e:
         logger.error(f"Error generating greeting: {str(e)}")
-        return "Hello and welcome to NextCore AI! We are Bangalore's leading digital transformation company specializing in AI automation, web development, mobile applications, and cloud services. How may I assist you today?"
+        return fallback_greeting(language)
+
+async def generate_ai_response(caller_number: str, user_speech: str, call_sid: str = "") -> str:
+    """Generate AI response based on user speech, company knowledge and earlier turns of the call"""
+    
+    if PHONE_ANSWER_MODE == "two_stage":
+        return await generate_ai_response_two_stage(caller_number, user_speech, call_sid)
+    
+    try:
+        # Retrieve context and write the spoken reply in one completion
+        return await aphone_query_agent(user_speech, caller_number, call_sid=call_sid)
+        
+    except Exception as e:
+        logger.error(f"Error generating AI response: {str(e)}")
+        return f"Thank you for asking about {user_speech}. NextCore AI provides comprehensive digital transformation services including AI automation, web development, mobile apps, and cloud solutions. For detailed information, please contact us at nextcoreai.in@gmail.com or +91 6202579799. How else can I help you?"
+
+def streams_answer_audio() -> bool:
+    """
+    Answers are synthesized sentence by sentence while the completion streams
+    when clips can be played back; an open chat or embeddings breaker keeps
+    the text path, whose offline tier still answers
+    """
+    return (TTS_PLAYBACK and bool(PUBLIC_BASE_URL) and PHONE_ANSWER_MODE == "single"
+            and not get_breaker("chat").is_open and not get_breaker("embeddings").is_open)
+
+async def generate_spoken_answer(caller_number: str, user_speech: str, call_sid: str = "") -> str:
+    """
+    Speech XML for an answer whose sentences go to TTS as soon as each one is
+    complete, so synthesis overlaps the rest of the completion and the reply
+    is ready about one sentence of TTS after the last token. Sentences whose
+    synthesis failed are <Say>-ed instead; if the answer fails before its
+    first sentence, the offline tiers answer like on the text path.
+    """
+    parts = []
+    try:
+        async for sentence, audio_path in speak_phone_answer(user_speech, caller_number, call_sid=call_sid, raise_errors=True):
+            parts.append(play_xml(stream_clip_url(audio_path)) if audio_path else say_xml(sentence))
+    except Exception as e:
+        if parts:
+            logger.error(f"Streamed answer failed after {len(parts)} sentences: {str(e)}")
+        else:
+            logger.warning(f"Streamed answer failed, using fallback: {str(e)}")
+            FALLBACK_ANSWERS.inc(path="phone")
+            return speak_xml(offline_answer(user_speech))
+    return "\n    ".join(parts)
 
-async def generate_ai_response(caller_number: str, user_speech: str) -> str:
-    """Generate AI response based on user speech and company knowledge"""
+async def generate_ai_response_two_stage(caller_number: str, user_speech: str, call_sid: str = "") -> str:
+    """Original pipeline: full RAG answer, then a second completion to shorten it for phone use"""
     
     try:
         # Use RAG system to get contextual response
-        rag_response = query_agent(user_speech)
+        rag_response = await aquery_agent(user_speech, call_sid=call_sid)
         
         # Enhance with conversational context
         prompt = f"""
@@ -141,21 +229,26 @@ async def generate_ai_response(caller_number: str, user_speech: str) -> str:
         5. Asks if they need more information
         """
         
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful customer service agent for NextCore AI. Provide clear, concise responses about our services. Always be professional and helpful. Keep responses under 80 words for phone calls."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
+        with stage_timer("llm_rewrite"), get_breaker("chat").guard():
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a helpful customer service agent for NextCore AI. Provide clear, concise responses about our services. Always be professional and helpful. Keep responses under 80 words for phone calls."
+                    },
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=150,
+                temperature=0.7
+            )
         
         return response.choices[0].message.content.strip()
         
+    except CircuitOpenError:
+        # Chat is down: the offline answer from the first stage is the best we have
+        return rag_response
+        
     except Exception as e:
         logger.error(f"Error generating AI response: {str(e)}")
         return f"Thank you for asking about {user_speech}. NextCore AI provides comprehensive digital transformation services including AI automation, web development, mobile apps, and cloud solutions. For detailed information, please contact us at nextcoreai.in@gmail.com or +91 6202579799. How else can I help you?"
@@ -164,12 +257,8 @@ async def handle_digit_input(digits: str) -> str:
     """Handle digit input from customer"""
     
     try:
-        if digits == "1":
-            return "Great! You've chosen to speak with our AI agent. Please tell me about your requirements for NextCore AI services - whether it's AI automation, web development, mobile apps, or cloud solutions."
-        elif digits == "2":
-            return "Thank you for choosing to leave a message. Please speak after the beep and tell us about your requirements. We'll get back to you within 24 hours."
-        elif digits == "0":
-            return "Connecting you to our support team. Please hold on while we transfer your call."
+        if digits in DIGIT_RESPONSES:
+            return DIGIT_RESPONSES[digits]
         else:
             return f"You pressed {digits}. For AI services press 1, to leave a message press 2, or speak directly about your requirements."
             
@@ -177,20 +266,28 @@ async def handle_digit_input(digits: str) -> str:
         logger.error(f"Error handling digit input: {str(e)}")
         return "Thank you for your input. Please tell me how I can help you with NextCore AI services."
 
-def create_exotel_response(message: str) -> str:
-    """Create Exotel-compatible XML response - Simple and Direct"""
-    
-    # Clean the message for XML safety
-    clean_message = message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+def speak_xml(message: str) -> str:
+    """<Play> a cached TTS clip when one exists for the message, otherwise <Say> it"""
+    return speech_xml(message, EXOTEL_VOICE)
+
+def say_xml(message: str) -> str:
+    """<Say> the message without looking for a cached clip"""
+    return speech_xml(message, EXOTEL_VOICE, playback=False)
+
+def create_exotel_response(message: str, spoken: str = None) -> str:
+    """
+    Create Exotel-compatible XML response - Simple and Direct
+    spoken is pre-rendered speech XML (e.g. per-sentence <Play> clips) used instead of the message
+    """
     
     # Direct conversation - no PIN, no complex gathering
     xml_response = f'''<?xml version="1.0" encoding="UTF-8"?>
 <Response>
-    <Say voice="woman">{clean_message}</Say>
+    {spoken or speak_xml(message)}
     <Gather input="speech" timeout="15" speechTimeout="auto" action="/exotel-voice-webhook" method="POST">
-        <Say voice="woman">Please tell me how I can help you with NextCore AI services.</Say>
+        {speak_xml(GATHER_PROMPT)}
     </Gather>
-    <Say voice="woman">Thank you for calling NextCore AI. For more information, contact us at nextcoreai.in@gmail.com. Have a great day!</Say>
+    {speak_xml(GOODBYE_MESSAGE)}
 </Response>'''
     
     return xml_response.strip()
@@ -199,11 +296,9 @@ def create_exotel_response(message: str) -> str:
 def create_exotel_response_hindi(message: str) -> str:
     """Create Exotel-compatible XML response in Hindi"""
     
-    clean_message = message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-    
     xml_response = f'''<?xml version="1.0" encoding="UTF-8"?>
 <Response>
-    <Say voice="woman" language="hi-IN">{clean_message}</Say>
+    {speech_xml(message, EXOTEL_VOICE, playback=False, language="hi-IN")}
     <Gather input="speech" timeout="8" speechTimeout="3" action="/exotel-voice-webhook" method="POST" language="hi-IN">
         <Say voice="woman" language="hi-IN">Kripaya bataiye main aapki kaise madad kar sakti hun.</Say>
     </Gather>
@@ -259,7 +354,7 @@ async def test_exotel_endpoint():
     """Test endpoint to verify Exotel integration"""
     
     # Test the AI response generation
-    test_response = query_agent("What services do you offer?")
+    test_response = await aquery_agent("What services do you offer?")
     
     return {
         "status": "✅ NextCore AI Voice Agent is working!",
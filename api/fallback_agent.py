@@ -1,5 +1,12 @@
 # Fallback query agent that works without OpenAI embeddings
+import os
+import re
+import time
+import threading
 import logging
+from collections import defaultdict
+from agent.config import KNOWLEDGE_BASE_DIR, LEXICAL_MIN_SCORE, LEXICAL_INDEX_PATH, INDEX_RELOAD_CHECK_INTERVAL
+from agent.metrics import FALLBACK_ANSWERS
 
 logger = logging.getLogger(__name__)
 
@@ -50,33 +57,124 @@ Please contact us at nextcoreai.in@gmail.com or +91 6202579799 for a detailed qu
 We specialize in AI automation, web development, mobile apps, cloud services, and digital design. Our vision is to reshape the digital world through intelligent systems and scalable architectures."""
 }
 
+# Weighted keywords and phrases per intent; the order doubles as the tie-break priority.
+# Generic words ("what", "do") carry little weight so they no longer swallow every question.
+INTENT_KEYWORDS = {
+    "services": {"service": 1.0, "offer": 1.0, "provide": 1.0, "do": 0.2, "what": 0.2,
+                 "what do you do": 1.5, "help with": 0.8},
+    "technologies": {"technology": 1.0, "tech": 1.0, "stack": 1.0, "tool": 1.0, "framework": 1.0,
+                     "language": 0.8, "platform": 0.6, "tech stack": 1.5},
+    "contact": {"contact": 1.0, "reach": 1.0, "phone": 1.0, "email": 1.0, "address": 1.0,
+                "call": 0.6, "number": 0.6, "location": 0.8, "located": 1.0, "where": 0.8, "office": 0.8,
+                "where are you": 1.5, "get in touch": 1.5, "talk to": 1.2},
+    "pricing": {"price": 1.0, "pricing": 1.0, "cost": 1.0, "fee": 1.0, "charge": 1.0, "charges": 1.0,
+                "rate": 1.0, "rates": 1.0, "quote": 1.0, "budget": 1.0, "expensive": 1.0, "cheap": 1.0,
+                "how much": 1.5},
+    "about": {"about": 1.0, "company": 1.0, "who": 1.0, "nextcore": 0.3, "vision": 1.0,
+              "mission": 1.0, "based": 0.8, "who are you": 1.5},
+}
+HEADING_WEIGHT = 0.3
+MIN_INTENT_SCORE = 0.2
+MAX_PHRASE_WORDS = 3
+STOPWORDS = {"and", "the", "of", "a", "an", "to", "for", "in", "on", "with", "ai", "details", "overview"}
+
+def tokenize(text):
+    """Lowercase word tokens (word-boundary split, so "do" never matches inside "download")"""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def normalize_token(token, vocabulary):
+    """
+    Fold a plural onto a word in vocabulary ("services" -> "service",
+    "technologies" -> "technology"). Words already in the vocabulary or
+    without a matching singular ("does", "this") are returned unchanged.
+    """
+    if token in vocabulary:
+        return token
+    candidates = []
+    if token.endswith("ies"):
+        candidates.append(token[:-3] + "y")
+    if token.endswith(("sses", "xes", "ches", "shes", "zes")):
+        candidates.append(token[:-2])
+    if token.endswith("s"):
+        candidates.append(token[:-1])
+    return next((candidate for candidate in candidates if candidate in vocabulary), token)
+
+def _heading_intent(heading):
+    """Map a knowledge base heading to the fallback intent it belongs to"""
+    lowered = heading.lower()
+    if "contact" in lowered:
+        return "contact"
+    if any(word in lowered for word in ("about", "vision", "mission", "why")):
+        return "about"
+    if re.match(r"\d+\.", heading.strip()):
+        return "services"
+    return None
+
+def _knowledge_base_headings(knowledge_base_dir=KNOWLEDGE_BASE_DIR):
+    """Yield markdown headings from the knowledge base files"""
+    path = os.path.join(knowledge_base_dir, "services.md")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                match = re.match(r"^#{1,6}\s+(.*)$", line)
+                if match:
+                    yield match.group(1).replace("*", "").strip()
+    except OSError as e:
+        logger.warning(f"Could not read knowledge base headings: {str(e)}")
+
+def build_intent_index():
+    """
+    Precompile {token tuple: [(intent, weight)]} from INTENT_KEYWORDS plus
+    service/contact/about headings in the knowledge base.
+    """
+    index = defaultdict(dict)
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for phrase, weight in keywords.items():
+            index[tuple(tokenize(phrase))][intent] = weight
+    keyword_vocabulary = {word for key in index for word in key}
+    
+    for heading in _knowledge_base_headings():
+        intent = _heading_intent(heading)
+        if intent is None:
+            continue
+        for token in tokenize(heading):
+            if token.isdigit() or token in STOPWORDS:
+                continue
+            key = (normalize_token(token, keyword_vocabulary),)
+            # Hand-written keywords win over heading-derived ones
+            index[key].setdefault(intent, HEADING_WEIGHT)
+    
+    return {key: list(intents.items()) for key, intents in index.items()}
+
+INTENT_INDEX = build_intent_index()
+INTENT_VOCABULARY = {word for key in INTENT_INDEX for word in key}
+INTENT_PRIORITY = {intent: rank for rank, intent in enumerate(INTENT_KEYWORDS)}
+
+def match_intent(question, index=INTENT_INDEX, vocabulary=INTENT_VOCABULARY):
+    """Return the best-scoring intent for a question, or None, in a single pass over its n-grams"""
+    tokens = [normalize_token(token, vocabulary) for token in tokenize(question)]
+    scores = defaultdict(float)
+    for start in range(len(tokens)):
+        for length in range(1, MAX_PHRASE_WORDS + 1):
+            key = tuple(tokens[start:start + length])
+            if len(key) < length:
+                break
+            for intent, weight in index.get(key, ()):
+                scores[intent] += weight
+    if not scores:
+        return None
+    intent, score = max(scores.items(), key=lambda item: (item[1], -INTENT_PRIORITY[item[0]]))
+    return intent if score >= MIN_INTENT_SCORE else None
+
 def query_agent_fallback(question: str) -> str:
     """
     Fallback query agent that works without OpenAI embeddings
-    Uses keyword matching for common queries
+    Uses a precompiled weighted keyword index to pick the best intent
     """
     try:
-        question_lower = question.lower()
-        
-        # Check for service-related queries
-        if any(word in question_lower for word in ["service", "offer", "do", "provide", "what"]):
-            return FALLBACK_RESPONSES["services"]
-        
-        # Check for technology queries
-        elif any(word in question_lower for word in ["technology", "tech", "stack", "tools", "framework"]):
-            return FALLBACK_RESPONSES["technologies"]
-        
-        # Check for contact queries
-        elif any(word in question_lower for word in ["contact", "reach", "phone", "email", "address"]):
-            return FALLBACK_RESPONSES["contact"]
-        
-        # Check for pricing queries
-        elif any(word in question_lower for word in ["price", "cost", "fee", "charge", "rate"]):
-            return FALLBACK_RESPONSES["pricing"]
-        
-        # Check for about queries
-        elif any(word in question_lower for word in ["about", "company", "who", "nextcore"]):
-            return FALLBACK_RESPONSES["about"]
+        intent = match_intent(question)
+        if intent:
+            return FALLBACK_RESPONSES[intent]
         
         # Default response
         else:
@@ -96,15 +194,106 @@ How else can I help you today?"""
 
 Please contact us at nextcoreai.in@gmail.com or +91 6202579799 for detailed assistance."""
 
+_lexical_index = None
+_lexical_mtime = None
+_lexical_last_check = 0.0
+_lexical_lock = threading.Lock()
+
+def _index_mtime(path=LEXICAL_INDEX_PATH):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def get_lexical_index():
+    """
+    The offline BM25 index (None until ingestion has built it), reloaded when
+    the file changes on disk. Checked every INDEX_RELOAD_CHECK_INTERVAL like
+    the query engine, but independently of it, so this tier keeps working
+    when the engine cannot be built.
+    """
+    global _lexical_index, _lexical_mtime, _lexical_last_check
+    now = time.monotonic()
+    if _lexical_index is not None and now - _lexical_last_check < INDEX_RELOAD_CHECK_INTERVAL:
+        return _lexical_index
+    with _lexical_lock:
+        _lexical_last_check = now
+        mtime = _index_mtime()
+        if _lexical_index is None or mtime != _lexical_mtime:
+            from agent.lexical_index import load_lexical_index
+            index = load_lexical_index()
+            if index is not None or mtime is None:
+                if _lexical_index is not None:
+                    logger.info("BM25 index changed on disk, reloading offline tier")
+                _lexical_index, _lexical_mtime = index, mtime
+    return _lexical_index
+
+def clean_chunk_for_speech(text, max_chars=600):
+    """Strip markdown from a knowledge base chunk and cut it at a sentence near max_chars"""
+    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)  # [label](link) -> label
+    text = re.sub(r"[#*_`>]+", "", text)
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(". ", 0, max_chars)
+    return text[:cut + 1] if cut > 0 else text[:max_chars]
+
+def query_agent_lexical(question: str):
+    """
+    Zero-network tier: answer from the best BM25-matching knowledge base chunk
+    Returns None when the index is missing or nothing matches well enough
+    """
+    try:
+        index = get_lexical_index()
+        if index is None:
+            return None
+        results = index.search_documents(question, k=1)
+        if not results or results[0].metadata["bm25_score"] < LEXICAL_MIN_SCORE:
+            return None
+        return clean_chunk_for_speech(results[0].page_content)
+    except Exception as e:
+        logger.error(f"Error in lexical query agent: {str(e)}")
+        return None
+
+def offline_answer(question: str) -> str:
+    """Best answer available without OpenAI: BM25 retrieval, then canned keyword answers"""
+    return query_agent_lexical(question) or query_agent_fallback(question)
+
 # Try to use the real query agent, fallback if it fails
 def query_agent(question: str) -> str:
     """
     Smart query agent with fallback capability
+    Upstream errors (including an open circuit breaker) go straight to the offline tiers
     """
     try:
-        # Try to import and use the real query agent
+        # Try to use the real query agent backed by the shared query engine
         from agent.query_agent import query_agent as real_query_agent
-        return real_query_agent(question)
+        return real_query_agent(question, raise_errors=True)
     except Exception as e:
         logger.warning(f"Real query agent failed, using fallback: {str(e)}")
-        return query_agent_fallback(question)
+        FALLBACK_ANSWERS.inc(path="query")
+        return offline_answer(question)
+
+async def aquery_agent(question: str, call_sid: str = None) -> str:
+    """
+    Async smart query agent with fallback capability
+    """
+    try:
+        from agent.query_agent import aquery_agent as real_aquery_agent
+        return await real_aquery_agent(question, raise_errors=True, call_sid=call_sid)
+    except Exception as e:
+        logger.warning(f"Real query agent failed, using fallback: {str(e)}")
+        FALLBACK_ANSWERS.inc(path="query")
+        return offline_answer(question)
+
+async def aphone_query_agent(question: str, caller_number: str = "Unknown", call_sid: str = None) -> str:
+    """
+    Phone-style answer in a single completion, with fallback capability
+    """
+    try:
+        from agent.query_agent import aphone_answer
+        return await aphone_answer(question, caller_number, raise_errors=True, call_sid=call_sid)
+    except Exception as e:
+        logger.warning(f"Phone answer failed, using fallback: {str(e)}")
+        FALLBACK_ANSWERS.inc(path="phone")
+        return offline_answer(question)
@@ -0,0 +1,269 @@
+# Pool of pre-generated caller greetings, refreshed in the background
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from agent.config import (
+    GREETING_LANGUAGES, GREETING_POOL_SIZE, GREETING_REFRESH_INTERVAL,
+    GREETING_POOL_PATH, GREETING_UTC_OFFSET_HOURS, TTS_PLAYBACK
+)
+from agent.circuit_breaker import get_breaker
+from voice.http_clients import get_async_openai_client
+
+logger = logging.getLogger(__name__)
+
+# Placeholder the generated variants start with; filled in per call
+SALUTATION = "{salutation}"
+MAX_GREETING_CHARS = 400
+RETRY_INTERVAL = 60  # Seconds before retrying a failed refresh
+
+# Variants are reused all day, so they must not name a time of day themselves
+TIME_OF_DAY_PATTERN = re.compile(
+    r"\bgood\s+(morning|afternoon|evening|night)\b"
+    r"|\b(shubh|su)\s*prabhat\b|\bshubh\s+(sandhya|ratri|sham|shaam)\b"
+    r"|\b(subah|dopahar|shaam|sham|raat)\b"
+    r"|शुभ\s*प्रभात|सुप्रभात|शुभ\s*संध्या|शुभ\s*रात्रि|सुबह|दोपहर|शाम",
+    re.IGNORECASE
+)
+
+FALLBACK_GREETINGS = {
+    "en": "Hello and welcome to NextCore AI! We are Bangalore's leading digital transformation company specializing in AI automation, web development, mobile applications, and cloud services. How may I assist you today?",
+    "hi": "Namaste! NextCore AI mein aapka swagat hai. Hum AI automation, web development, mobile apps aur cloud services mein madad karte hain. Bataiye, main aapki kya sahayata kar sakti hoon?",
+}
+
+GREETING_SYSTEM_PROMPT = "You are a professional customer service representative for NextCore AI, a Bangalore-based digital transformation company. Be warm, helpful, and concise. Respond in under 50 words."
+
+GREETING_PROMPTS = {
+    "en": f"A customer just called NextCore AI. Greet them politely and ask how we can assist with NextCore AI services. Keep it brief and professional. Begin with the exact text {SALUTATION} followed by a comma or exclamation mark; it is replaced with \"Good morning\", \"Good afternoon\" or \"Good evening\".",
+    "hi": f"Ek customer ne NextCore AI ko call kiya hai. Use Hindi me greet karo aur NextCore AI services ke baare me kaise help kar sakte hain ye poocho. Brief aur professional rakhna. Jawab exact text {SALUTATION} se shuru karna; use \"Namaste\" se badla jayega.",
+}
+
+def local_hour(now=None, utc_offset_hours=GREETING_UTC_OFFSET_HOURS):
+    """Hour of day in the callers' time zone"""
+    now = now or datetime.now(timezone.utc)
+    return (now + timedelta(hours=utc_offset_hours)).hour
+
+def salutation(language, now=None):
+    """Time-of-day salutation for a language"""
+    if language == "hi":
+        return "Namaste"
+    hour = local_hour(now)
+    if 5 <= hour < 12:
+        return "Good morning"
+    if 12 <= hour < 17:
+        return "Good afternoon"
+    return "Good evening"
+
+def render_greeting(template, language, now=None):
+    """Fill the cheap per-call fields into a pooled variant"""
+    return template.replace(SALUTATION, salutation(language, now))
+
+def fallback_greeting(language):
+    """Static greeting used while the pool is empty"""
+    return FALLBACK_GREETINGS.get(language, FALLBACK_GREETINGS["en"])
+
+def clean_variant(text):
+    """
+    Normalize a generated variant, returning None if it is unusable: too
+    long, missing the salutation placeholder, or carrying its own
+    time-of-day greeting that would contradict the per-call salutation
+    """
+    text = " ".join((text or "").split()).strip('"')
+    if not text or len(text) > MAX_GREETING_CHARS:
+        return None
+    if text.count(SALUTATION) != 1:
+        return None
+    if TIME_OF_DAY_PATTERN.search(text.replace(SALUTATION, "")):
+        return None
+    return text
+
+class GreetingPool:
+    """
+    Pre-generated greeting variants per language.
+    pick() is a constant-time random choice over the current list; refresh()
+    swaps in a freshly generated list in one assignment, so readers never
+    wait on the LLM. Variants are persisted so restarts and sibling workers
+    reuse them instead of regenerating.
+    """
+
+    def __init__(self, path=GREETING_POOL_PATH, size=GREETING_POOL_SIZE,
+                 languages=GREETING_LANGUAGES, refresh_interval=GREETING_REFRESH_INTERVAL):
+        self.path = path
+        self.size = size
+        self.languages = tuple(language.strip() for language in languages if language.strip())
+        self.refresh_interval = refresh_interval
+        self.picks = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._variants = {}
+        self._generated_at = {}
+        self._loaded_mtime = None
+        self.load()
+
+    def load(self):
+        """Load persisted variants, ignoring a missing or corrupt file"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Could not load greeting pool {self.path}: {str(e)}")
+            return
+        for language, entry in data.items():
+            variants = [v for v in (clean_variant(text) for text in entry.get("variants", [])) if v]
+            if variants and entry.get("generated_at", 0) >= self._generated_at.get(language, 0):
+                self._variants[language] = variants
+                self._generated_at[language] = entry.get("generated_at", 0)
+        self._loaded_mtime = mtime
+        logger.info(f"Loaded greeting pool: { {language: len(v) for language, v in self._variants.items()} }")
+
+    def reload_if_changed(self):
+        """Pick up variants another worker has written since we last looked"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def save(self):
+        """Persist variants atomically"""
+        data = {
+            language: {"variants": variants, "generated_at": self._generated_at.get(language, 0)}
+            for language, variants in self._variants.items()
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = os.path.getmtime(self.path)
+        except Exception as e:
+            logger.warning(f"Could not save greeting pool {self.path}: {str(e)}")
+
+    def pick(self, language, now=None):
+        """A personalized greeting in constant time, or None while the pool is empty"""
+        variants = self._variants.get(language)
+        if not variants:
+            self.misses += 1
+            return None
+        self.picks += 1
+        return render_greeting(random.choice(variants), language, now)
+
+    def phrases(self, language):
+        """Every rendering a caller can hear, for TTS pre-warming"""
+        if language == "hi":
+            moments = [datetime.now(timezone.utc)]
+        else:
+            # One UTC time per salutation: morning, afternoon, evening in the callers' zone
+            base = datetime(2000, 1, 1, tzinfo=timezone.utc) - timedelta(hours=GREETING_UTC_OFFSET_HOURS)
+            moments = [base + timedelta(hours=hour) for hour in (9, 14, 20)]
+        return sorted({render_greeting(v, language, now) for v in self._variants.get(language, []) for now in moments})
+
+    def is_stale(self, language):
+        return time.time() - self._generated_at.get(language, 0) >= self.refresh_interval
+
+    def seconds_until_stale(self):
+        """Time until the next language needs refreshing"""
+        now = time.time()
+        due = min((self._generated_at.get(language, 0) + self.refresh_interval for language in self.languages), default=now)
+        return max(0.0, due - now)
+
+    async def generate_variants(self, language):
+        """Ask the LLM for a batch of variants in a single request"""
+        prompt = GREETING_PROMPTS.get(language, GREETING_PROMPTS["en"])
+        with get_breaker("chat").guard():
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": GREETING_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=100,
+                temperature=0.9,
+                n=self.size
+            )
+        variants = []
+        for choice in response.choices:
+            variant = clean_variant(choice.message.content)
+            if variant and variant not in variants:
+                variants.append(variant)
+        return variants
+
+    async def refresh(self, language):
+        """Regenerate one language's variants and swap them in"""
+        variants = await self.generate_variants(language)
+        if not variants:
+            raise ValueError(f"No usable greeting variants generated for {language}")
+        self._variants[language] = variants
+        self._generated_at[language] = time.time()
+        self.refreshes += 1
+        self.save()
+        logger.info(f"Greeting pool refreshed: {len(variants)} {language} variants")
+        if TTS_PLAYBACK:
+            from voice.text_to_speech import prewarm_tts_cache
+            asyncio.get_running_loop().run_in_executor(None, prewarm_tts_cache, self.phrases(language))
+        return variants
+
+    async def refresh_stale(self):
+        """Refresh every language that is empty or past the refresh interval; True if all succeeded"""
+        self.reload_if_changed()
+        ok = True
+        for language in self.languages:
+            if not self.is_stale(language):
+                continue
+            try:
+                await self.refresh(language)
+            except Exception as e:
+                ok = False
+                logger.warning(f"Greeting pool refresh failed for {language}: {str(e)}")
+        return ok
+
+    def stats(self):
+        """Pool sizes and pick/miss counters"""
+        return {
+            "variants": {language: len(self._variants.get(language, [])) for language in self.languages},
+            "picks": self.picks,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+_pool = None
+_refresher = None
+
+def get_greeting_pool():
+    """Return the process-wide greeting pool"""
+    global _pool
+    if _pool is None:
+        _pool = GreetingPool()
+    return _pool
+
+def start_greeting_refresher():
+    """Start the background task that keeps the pool fresh (call from the running event loop)"""
+    global _refresher
+    if _refresher is not None and not _refresher.done():
+        return _refresher
+    pool = get_greeting_pool()
+
+    async def refresh_forever():
+        while True:
+            ok = await pool.refresh_stale()
+            delay = pool.seconds_until_stale() if ok else RETRY_INTERVAL
+            await asyncio.sleep(max(delay, 1.0))
+
+    _refresher = asyncio.get_running_loop().create_task(refresh_forever())
+    return _refresher
+
+def stop_greeting_refresher():
+    """Cancel the background refresh task"""
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        _refresher = None
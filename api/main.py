@@ -1,8 +1,15 @@
 from fastapi import FastAPI, Request, Form
 from fastapi.responses import PlainTextResponse
 from twilio.twiml.voice_response import VoiceResponse, Gather
-from api.call_response import generate_response
-from api.exotel_webhook import router as exotel_router
+from api.call_response import agenerate_response
+from agent.conversation_store import end_call_if_finished
+from api.exotel_webhook import router as exotel_router, FIXED_PHRASES
+from api.tts_routes import router as tts_router, speech_verb
+from api.metrics_routes import router as metrics_router
+from agent.metrics import stage_timer
+from agent.config import TTS_PLAYBACK, GREETING_MODE, WARM_UP_QUESTION
+from voice.text_to_speech import prewarm_tts_cache
+import asyncio
 import uvicorn
 import logging
 
@@ -14,6 +21,56 @@ app = FastAPI(title="NextCore AI Voice Agent", version="1.0.0")
 
 # Include Exotel webhook router
 app.include_router(exotel_router)
+app.include_router(tts_router)
+app.include_router(metrics_router)
+
+# Whole-turn latency per webhook, on top of the per-stage timings recorded inside each turn
+TURN_STAGES = {"/exotel-voice-webhook": "turn_exotel", "/voice": "turn_twilio"}
+
+@app.middleware("http")
+async def time_turns(request: Request, call_next):
+    stage = TURN_STAGES.get(request.url.path)
+    if stage is None:
+        return await call_next(request)
+    with stage_timer(stage):
+        return await call_next(request)
+
+@app.on_event("startup")
+async def warm_up():
+    """Build the shared query engine once so caller turns reuse it"""
+    try:
+        from agent.query_agent import warm_up_query_engine
+        from voice.http_clients import get_openai_client, get_http_session
+        # Runs before this worker accepts connections
+        warm_up_query_engine(WARM_UP_QUESTION)
+        get_openai_client()
+        get_http_session("elevenlabs")
+        logger.info("✅ Query engine warmed up")
+    except Exception as e:
+        logger.warning(f"Query engine warm-up failed, will retry on first call: {str(e)}")
+    
+    # Age-based sweeping of abandoned per-request audio files
+    from voice.audio_utils import start_temp_audio_janitor
+    start_temp_audio_janitor()
+    
+    if GREETING_MODE == "pool":
+        # Pre-generated greetings so callers never wait on a completion to hear hello
+        from api.greeting_pool import start_greeting_refresher
+        start_greeting_refresher()
+    
+    if TTS_PLAYBACK:
+        # Synthesize fixed prompts in the background; calls fall back to <Say> until ready
+        asyncio.get_running_loop().run_in_executor(None, prewarm_tts_cache, FIXED_PHRASES + TWILIO_FIXED_PHRASES)
+
+@app.on_event("shutdown")
+async def close_clients():
+    """Close pooled outbound connections"""
+    from voice.http_clients import close_async_clients
+    from voice.audio_utils import stop_temp_audio_janitor
+    from api.greeting_pool import stop_greeting_refresher
+    stop_greeting_refresher()
+    await close_async_clients()
+    stop_temp_audio_janitor()
 
 @app.get("/")
 async def root():
@@ -44,6 +101,11 @@ async def health_check():
         "timestamp": "2025-07-23"
     }
 
+TWILIO_GATHER_PROMPT = "Please tell me how I can assist you."
+TWILIO_GOODBYE_MESSAGE = "Thank you for calling NextCore AI. Have a great day!"
+TWILIO_FIXED_PHRASES = [TWILIO_GATHER_PROMPT, TWILIO_GOODBYE_MESSAGE]
+TWILIO_VOICE = "Polly.Joanna"
+
 @app.post("/voice", response_class=PlainTextResponse)
 async def voice(request: Request):
     """Handles the incoming call and responds with AI-generated speech."""
@@ -55,9 +117,12 @@ async def voice(request: Request):
     
     logger.info(f"Call ID: {call_sid}, User said: {speech_result}")
     
+    if end_call_if_finished(call_sid, form_data.get("CallStatus")):
+        return PlainTextResponse(str(VoiceResponse()), media_type="application/xml")
+    
     try:
         if speech_result:
-            response_text = generate_response(speech_result)
+            response_text = await agenerate_response(speech_result, call_sid=call_sid)
         else:
             response_text = "Welcome to NextCore AI! How can I help you today?"
 
@@ -73,12 +138,12 @@ async def voice(request: Request):
             speech_timeout='auto',
             language='en-US'
         )
-        gather.say("Please tell me how I can assist you.", voice='Polly.Joanna')
+        gather.append(speech_verb(TWILIO_GATHER_PROMPT, TWILIO_VOICE))
         
         twiml.append(gather)
         
         # If no input received, say goodbye
-        twiml.say("Thank you for calling NextCore AI. Have a great day!", voice='Polly.Joanna')
+        twiml.append(speech_verb(TWILIO_GOODBYE_MESSAGE, TWILIO_VOICE))
         
         return PlainTextResponse(str(twiml), media_type="application/xml")
         
@@ -0,0 +1,57 @@
+# Prometheus /metrics endpoint: stage latencies, cache hit rates and upstream error counts
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import logging
+from agent.metrics import CallbackMetric, register, render_metrics
+from agent.circuit_breaker import breaker_metrics, CLOSED, OPEN, HALF_OPEN
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def cache_stats():
+    """{cache name: {"hits", "misses"}} for every cache in this process"""
+    from agent.answer_cache import get_answer_cache
+    from agent.embedding_cache import get_embeddings
+    from voice.text_to_speech import tts_cache_stats
+    from api.greeting_pool import get_greeting_pool
+
+    stats = {"embedding": get_embeddings().stats(), "tts": tts_cache_stats()}
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        stats["answer"] = answer_cache.stats()
+    pool = get_greeting_pool().stats()
+    stats["greeting_pool"] = {"hits": pool["picks"], "misses": pool["misses"]}
+    return stats
+
+def cache_lookups():
+    for cache, stats in sorted(cache_stats().items()):
+        yield {"cache": cache, "result": "hit"}, stats["hits"]
+        yield {"cache": cache, "result": "miss"}, stats["misses"]
+
+def cache_hit_ratios():
+    for cache, stats in sorted(cache_stats().items()):
+        total = stats["hits"] + stats["misses"]
+        yield {"cache": cache}, stats["hits"] / total if total else 0.0
+
+def upstream_counter(field):
+    def collect():
+        for upstream, metrics in sorted(breaker_metrics().items()):
+            yield {"upstream": upstream}, metrics[field]
+    return collect
+
+def circuit_states():
+    for upstream, metrics in sorted(breaker_metrics().items()):
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            yield {"upstream": upstream, "state": state}, 1 if metrics["state"] == state else 0
+
+register(CallbackMetric("voice_agent_cache_lookups_total", "Cache lookups by cache and result", "counter", cache_lookups))
+register(CallbackMetric("voice_agent_cache_hit_ratio", "Share of lookups served from each cache since start", "gauge", cache_hit_ratios))
+register(CallbackMetric("voice_agent_upstream_calls_total", "Calls made to each upstream (circuit breaker name)", "counter", upstream_counter("calls")))
+register(CallbackMetric("voice_agent_upstream_errors_total", "Failed calls to each upstream", "counter", upstream_counter("failures")))
+register(CallbackMetric("voice_agent_upstream_rejected_total", "Calls short-circuited by an open breaker", "counter", upstream_counter("rejected")))
+register(CallbackMetric("voice_agent_circuit_state", "Current breaker state per upstream (1 for the active state)", "gauge", circuit_states))
+
+@router.get("/metrics")
+async def metrics():
+    """Metrics for this worker process in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,56 @@
+# Serves cached TTS clips so Exotel/Twilio can <Play> them
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+import os
+import logging
+from twilio.twiml.voice_response import Play, Say
+from voice.text_to_speech import tts_cache_path, stream_clip_path, cached_clip_url
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def speech_verb(message, voice, playback=True, **attributes):
+    """
+    TwiML verb for speaking a message: <Play> its cached TTS clip when
+    playback is possible, otherwise <Say> it. Shared by the Exotel and
+    Twilio webhooks so both escape and attribute speech the same way.
+    """
+    clip_url = cached_clip_url(message) if playback else None
+    if clip_url:
+        return Play(clip_url)
+    return Say(message, voice=voice, **attributes)
+
+def speech_xml(message, voice, playback=True, **attributes):
+    """speech_verb as an XML fragment, for responses assembled as strings"""
+    return speech_verb(message, voice, playback, **attributes).to_xml(xml_declaration=False)
+
+def play_xml(url):
+    """<Play> fragment for an already synthesized clip"""
+    return Play(url).to_xml(xml_declaration=False)
+
+@router.get("/tts/{key}.mp3")
+async def get_tts_clip(key: str):
+    """Return a cached TTS clip by its content key"""
+    try:
+        path = tts_cache_path(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    # Touch so recently played clips survive LRU eviction
+    os.utime(path)
+    return FileResponse(path, media_type="audio/mpeg")
+
+@router.get("/tts/stream/{key}.mp3")
+async def get_stream_clip(key: str):
+    """Return a one-off clip synthesized for a streamed answer sentence"""
+    try:
+        path = stream_clip_path(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Clip not found")
+    return FileResponse(path, media_type="audio/mpeg")
@@ -2,7 +2,9 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import Response
 from twilio.twiml.voice_response import VoiceResponse
-from agent.query_agent import query_agent
+from agent.query_agent import aquery_agent
+from agent.conversation_store import end_call_if_finished
+from api.tts_routes import speech_verb
 
 router = APIRouter()
 
@@ -10,12 +12,15 @@ router = APIRouter()
 async def handle_call(request: Request):
     form = await request.form()
     user_text = form.get("SpeechResult")
+    call_sid = form.get("CallSid")
+    if end_call_if_finished(call_sid, form.get("CallStatus")):
+        return Response(content=str(VoiceResponse()), media_type="application/xml")
 
     if user_text:
-        answer = query_agent(user_text)
+        answer = await aquery_agent(user_text, call_sid=call_sid)
     else:
         answer = "I'm sorry, I didn't catch that. Could you repeat?"
 
     resp = VoiceResponse()
-    resp.say(answer, voice='alice')
+    resp.append(speech_verb(answer, 'alice'))
     return Response(content=str(resp), media_type="application/xml")
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Load test for api.main:app: replays synthetic Exotel (/exotel-voice-webhook)
+and Twilio (/voice) form posts at each configured concurrency and reports
+p50/p95/p99 turn latency and throughput per configuration.
+
+    python -m benchmarks.load_test --concurrency 1,10,50 --requests 300 --workers 2 --error-rates 0,0.1
+
+By default the app and the upstream stubs (benchmarks/stub_upstreams.py) are
+started as subprocesses. The app runs in a scratch directory holding a copy
+of the vector index and knowledge base, so stub embeddings and answers never
+land in the real caches under agent/cache/. Use --target/--stub-url to test
+servers you started yourself.
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What services does NextCore AI offer?",
+    "Do you build mobile apps with Flutter?",
+    "How much does a website cost?",
+    "Can you help us move to AWS?",
+    "What technologies do you use for AI projects?",
+    "How can I contact your team?",
+    "Tell me more about that.",
+    "Do you do SEO and content writing?",
+    "Where is your office located?",
+    "Can you build an ecommerce store on Shopify?",
+]
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+def call_plan(index, turns_per_call, twilio_share, unique_questions, rng):
+    """The turns of one synthetic call: [(kind, path, form)]"""
+    call_sid = f"CA{uuid.uuid4().hex}"
+    caller = f"+9198{rng.randrange(10**8):08d}"
+    twilio = rng.random() < twilio_share
+    path = "/voice" if twilio else "/exotel-voice-webhook"
+    provider = "twilio" if twilio else "exotel"
+    base = {"CallSid": call_sid, "From": caller, "CallStatus": "in-progress"}
+
+    turns = [(f"{provider}_greeting", path, dict(base))]
+    for turn in range(turns_per_call):
+        question = rng.choice(QUESTIONS)
+        if unique_questions:
+            # Defeats exact-match answer caching
+            question = f"{question} Reference {index}-{turn}."
+        turns.append((f"{provider}_turn", path, {**base, "SpeechResult": question}))
+    return turns
+
+async def run_configuration(target, concurrency, total_requests, turns_per_call, twilio_share,
+                            unique_questions, timeout, seed):
+    """Closed-loop load: `concurrency` callers each place calls back to back until total_requests turns are sent"""
+    rng = random.Random(seed)
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    sent = 0
+    call_index = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        async def caller():
+            nonlocal sent, call_index
+            while sent < total_requests:
+                call_index += 1
+                for kind, path, form in call_plan(call_index, turns_per_call, twilio_share, unique_questions, rng):
+                    if sent >= total_requests:
+                        return
+                    sent += 1
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(path, data=form)
+                        ok = response.status_code == 200 and "<Response" in response.text
+                    except httpx.HTTPError:
+                        ok = False
+                    elapsed = time.perf_counter() - started
+                    latencies[kind].append(elapsed)
+                    if not ok:
+                        failures[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(caller() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = {
+        "concurrency": concurrency,
+        "requests": len(all_latencies),
+        "errors": sum(failures.values()),
+        "duration_s": duration,
+        "throughput_rps": len(all_latencies) / duration if duration else 0.0,
+        **summarize(all_latencies),
+        "by_kind": {
+            kind: {**summarize(values), "errors": failures[kind]}
+            for kind, values in sorted(latencies.items())
+        },
+    }
+    return result
+
+def wait_until_ready(url, timeout, process=None):
+    """Poll url until it answers 200, failing early if the process dies"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} process exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+def prepare_workspace():
+    """Scratch working directory with copies of the index and knowledge base"""
+    workspace = tempfile.mkdtemp(prefix="voice-agent-load-")
+    for relative in ("agent/db", "agent/knowledge_base"):
+        source = os.path.join(REPO_ROOT, relative)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workspace, relative))
+    return workspace
+
+def app_environment(stub_url):
+    """Environment that routes every provider call to the stubs"""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OPENAI_API_KEY": "sk-stub",
+        "ELEVENLABS_BASE_URL": stub_url,
+        "ELEVENLABS_API_KEY": "stub",
+        "POLLY_ENDPOINT_URL": f"{stub_url}/polly",
+        "AWS_ACCESS_KEY_ID": "stub",
+        "AWS_SECRET_ACCESS_KEY": "stub",
+        "AWS_REGION": "us-east-1",
+    })
+    return env
+
+def set_stub_error_rate(stub_url, error_rate):
+    httpx.post(f"{stub_url}/_stub/config", json={"all": {"error_rate": error_rate}}, timeout=5).raise_for_status()
+    httpx.post(f"{stub_url}/_stub/reset", timeout=5).raise_for_status()
+
+def stub_stats(stub_url):
+    return httpx.get(f"{stub_url}/_stub/stats", timeout=5).json()
+
+def format_table(results):
+    header = f"{'errors%':>8} {'conc':>5} {'reqs':>6} {'fail':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'upstream/turn':>14}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['stub_error_rate'] * 100:>7.1f}% {r['concurrency']:>5} {r['requests']:>6} {r['errors']:>5} "
+            f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['throughput_rps']:>8.2f} "
+            f"{r.get('upstream_calls_per_request', 0):>14.2f}"
+        )
+        for kind, k in r["by_kind"].items():
+            lines.append(
+                f"{'':>8} {'':>5} {k['count']:>6} {k['errors']:>5} {k['p50_ms']:>9.1f} {k['p95_ms']:>9.1f} "
+                f"{k['p99_ms']:>9.1f}   {kind}"
+            )
+    return "\n".join(lines)
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-call load test for the voice agent")
+    parser.add_argument("--concurrency", default="1,5,20", help="Comma-separated concurrent callers per configuration")
+    parser.add_argument("--error-rates", default="0", help="Comma-separated stub error rates per configuration")
+    parser.add_argument("--requests", type=int, default=200, help="Turns sent per configuration")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured turns sent before each configuration")
+    parser.add_argument("--turns-per-call", type=int, default=3, help="Speech turns after each call's greeting")
+    parser.add_argument("--twilio-share", type=float, default=0.5, help="Share of calls sent to /voice instead of Exotel")
+    parser.add_argument("--unique-questions", action="store_true", help="Make every question unique to bypass the answer cache")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="App worker processes when the app is launched here")
+    parser.add_argument("--port", type=int, default=8800, help="App port when launched here")
+    parser.add_argument("--stub-port", type=int, default=9100, help="Stub port when launched here")
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=SECONDS", help="Stub latency override (see stub_upstreams)")
+    parser.add_argument("--app-env", action="append", metavar="NAME=VALUE", help="Extra app setting, e.g. ANSWER_CACHE_ENABLED=false")
+    parser.add_argument("--target", help="Base URL of an already running app (skips launching it)")
+    parser.add_argument("--stub-url", help="Base URL of already running stubs (skips launching them)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    processes = []
+    workspace = None
+    try:
+        stub_url = args.stub_url
+        if stub_url is None:
+            stub_url = f"http://127.0.0.1:{args.stub_port}"
+            command = [sys.executable, "-m", "benchmarks.stub_upstreams", "--port", str(args.stub_port), "--seed", str(args.seed)]
+            for latency in args.latency or []:
+                command += ["--latency", latency]
+            processes.append(subprocess.Popen(command, cwd=REPO_ROOT))
+            wait_until_ready(f"{stub_url}/_stub/config", 30, processes[-1])
+
+        target = args.target
+        if target is None:
+            target = f"http://127.0.0.1:{args.port}"
+            workspace = prepare_workspace()
+            env = app_environment(stub_url)
+            for setting in args.app_env or []:
+                name, _, value = setting.partition("=")
+                env[name] = value
+            command = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+                       "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"]
+            processes.append(subprocess.Popen(command, cwd=workspace, env=env))
+            wait_until_ready(f"{target}/health", 120, processes[-1])
+
+        results = []
+        for error_rate in parse_list(args.error_rates, float):
+            for concurrency in parse_list(args.concurrency, int):
+                set_stub_error_rate(stub_url, error_rate)
+                if args.warmup:
+                    asyncio.run(run_configuration(target, concurrency, args.warmup, args.turns_per_call,
+                                                  args.twilio_share, args.unique_questions, args.timeout, args.seed + 1))
+                    set_stub_error_rate(stub_url, error_rate)
+                result = asyncio.run(run_configuration(target, concurrency, args.requests, args.turns_per_call,
+                                                       args.twilio_share, args.unique_questions, args.timeout, args.seed))
+                upstream = stub_stats(stub_url)
+                result["stub_error_rate"] = error_rate
+                result["upstream_calls"] = upstream["calls"]
+                result["upstream_errors"] = upstream["errors"]
+                result["upstream_calls_per_request"] = sum(upstream["calls"].values()) / max(1, result["requests"])
+                results.append(result)
+                print(f"error rate {error_rate:.2f}, concurrency {concurrency}: "
+                      f"p50 {result['p50_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms, "
+                      f"p99 {result['p99_ms']:.0f} ms, {result['throughput_rps']:.1f} req/s, {result['errors']} errors")
+
+        print()
+        print(format_table(results))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults written to {args.output}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
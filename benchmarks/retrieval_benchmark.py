@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality vs cost over chunking settings: for every chunk size,
+overlap and k it splits the knowledge base like ingestion does, indexes the
+chunks in an in-memory Chroma collection and runs a labelled question set,
+reporting recall@k, MRR, prompt tokens and vector search latency.
+
+    python -m benchmarks.retrieval_benchmark --chunk-sizes 250,500,1000 --overlaps 0,50,100 --k 1,2,3,5 --output retrieval.md
+
+A question's label is a list of phrases from the knowledge base; recall@k is
+the share of those phrases found in the top-k chunks, so labels stay valid
+however the corpus is chunked. By default chunks and questions are embedded
+with a deterministic hashed bag-of-words stand-in, so the sweep runs offline
+and gives the same numbers every time; --embeddings openai uses the real
+(cached) embedding model instead.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import argparse
+import statistics
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# The agent modules export the key at import time; the offline sweep never uses it
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+from agent.config import CHUNK_SIZE, CHUNK_OVERLAP, RETRIEVAL_K, KNOWLEDGE_BASE_DIR
+from agent.load_documents import create_splitter, scan_knowledge_base, split_file
+from agent.query_agent import create_phone_messages, format_context
+from agent.lexical_index import tokenize
+from agent.batch_embedder import get_encoding
+from agent.vector_index import NumpyVectorIndex
+
+DEFAULT_QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_questions.json")
+EMBEDDING_DIM = 1536
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline stand-in for the embedding model: signed feature hashing of word
+    unigrams and bigrams with sublinear term frequency, L2-normalized.
+    Texts sharing vocabulary land close together, which is enough to compare
+    chunking settings against each other without network access.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            index = value % self.dim
+            sign = 1.0 if value >> 63 else -1.0
+            counts[(index, sign)] = counts.get((index, sign), 0) + 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for (index, sign), tf in counts.items():
+            vector[index] += sign * (1 + math.log(tf))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def load_questions(path):
+    """[{"question": str, "expected": [phrase, ...]}]"""
+    with open(path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    for item in questions:
+        if not item.get("expected"):
+            raise ValueError(f"Question has no expected phrases: {item.get('question')}")
+    return questions
+
+def chunk_corpus(chunk_size, chunk_overlap, knowledge_base_dir=KNOWLEDGE_BASE_DIR):
+    """{chunk_id: Document} for the whole knowledge base, split exactly as ingestion would"""
+    splitter = create_splitter(chunk_size, chunk_overlap)
+    chunks = {}
+    for path in scan_knowledge_base(knowledge_base_dir):
+        chunks.update(split_file(path, splitter))
+    return chunks
+
+def score(docs, expected):
+    """(recall, reciprocal rank of the first chunk containing an expected phrase)"""
+    texts = [normalize(doc.page_content) for doc in docs]
+    phrases = [normalize(phrase) for phrase in expected]
+    found = sum(1 for phrase in phrases if any(phrase in text for text in texts))
+    first = next((rank for rank, text in enumerate(texts, 1) if any(phrase in text for phrase in phrases)), None)
+    return found / len(phrases), 1 / first if first else 0.0
+
+def prompt_tokens(encoding, question, docs):
+    """Tokens of the phone prompt (system + user message) built from these chunks"""
+    messages = create_phone_messages("+910000000000", question, format_context(docs))
+    return sum(len(encoding.encode(message.content, disallowed_special=())) for message in messages)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(1, math.ceil(q / 100 * len(values))) - 1]
+
+def evaluate(vectorstore, questions, query_vectors, k, encoding, repeat):
+    """Metrics for one (chunking, k) configuration"""
+    recalls, reciprocal_ranks, tokens, context_tokens, latencies = [], [], [], [], []
+    for item, vector in zip(questions, query_vectors):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            docs = vectorstore.similarity_search_by_vector(vector, k=k)
+            latencies.append(time.perf_counter() - started)
+        recall, reciprocal_rank = score(docs, item["expected"])
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+        tokens.append(prompt_tokens(encoding, item["question"], docs))
+        context_tokens.append(len(encoding.encode(format_context(docs), disallowed_special=())))
+    return {
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "prompt_tokens": statistics.mean(tokens),
+        "context_tokens": statistics.mean(context_tokens),
+        "search_p50_ms": percentile(latencies, 50) * 1000,
+        "search_p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+def run_sweep(chunk_sizes, overlaps, ks, questions, embeddings, repeat=5, backend="chroma"):
+    """Evaluate every valid (chunk size, overlap, k) combination"""
+    encoding = get_encoding()
+    # Question vectors do not depend on chunking, so embed them once
+    query_vectors = [embeddings.embed_query(item["question"]) for item in questions]
+    results = []
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            chunks = chunk_corpus(chunk_size, chunk_overlap)
+            vectorstore = Chroma.from_texts(
+                texts=[doc.page_content for doc in chunks.values()],
+                embedding=embeddings,
+                metadatas=[doc.metadata for doc in chunks.values()],
+                ids=list(chunks),
+                collection_name=f"retrieval_benchmark_{chunk_size}_{chunk_overlap}"
+            )
+            try:
+                index = NumpyVectorIndex.from_chroma(vectorstore, embeddings) if backend == "numpy" else vectorstore
+                # Warm the index before timing
+                index.similarity_search_by_vector(query_vectors[0], k=max(ks))
+                for k in ks:
+                    metrics = evaluate(index, questions, query_vectors, k, encoding, repeat)
+                    results.append({
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "k": k,
+                        "chunks": len(chunks),
+                        "current": (chunk_size, chunk_overlap, k) == (CHUNK_SIZE, CHUNK_OVERLAP, RETRIEVAL_K),
+                        **metrics,
+                    })
+            finally:
+                vectorstore.delete_collection()
+    return results
+
+COLUMNS = [
+    ("chunk_size", "chunk size", "{}"),
+    ("chunk_overlap", "overlap", "{}"),
+    ("k", "k", "{}"),
+    ("chunks", "chunks", "{}"),
+    ("recall", "recall@k", "{:.3f}"),
+    ("mrr", "MRR", "{:.3f}"),
+    ("prompt_tokens", "prompt tokens", "{:.0f}"),
+    ("context_tokens", "context tokens", "{:.0f}"),
+    ("search_p50_ms", "search p50 ms", "{:.2f}"),
+    ("search_p95_ms", "search p95 ms", "{:.2f}"),
+]
+
+def format_markdown(results):
+    """Comparison table; the row matching the current config is marked with *"""
+    lines = [
+        "| " + " | ".join(title for _, title, _ in COLUMNS) + " |",
+        "|" + "|".join("---:" for _ in COLUMNS) + "|",
+    ]
+    for row in results:
+        cells = [fmt.format(row[key]) for key, _, fmt in COLUMNS]
+        if row["current"]:
+            cells[0] += " *"
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+def parse_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunk size, overlap and k against a labelled question set")
+    parser.add_argument("--chunk-sizes", default="250,500,750,1000")
+    parser.add_argument("--overlaps", default="0,50,100")
+    parser.add_argument("--k", default="1,2,3,4,5")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS_PATH, help="Labelled question set (JSON)")
+    parser.add_argument("--embeddings", choices=["hashing", "openai"], default="hashing",
+                        help="hashing: offline deterministic stand-in; openai: the cached production embedding model")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma", help="Vector search backend to time (RETRIEVAL_BACKEND)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed searches per question")
+    parser.add_argument("--sort", choices=["config", "recall", "tokens"], default="config")
+    parser.add_argument("--output", help="Write the table to this path (.json for raw results, otherwise Markdown)")
+    args = parser.parse_args()
+
+    if args.embeddings == "openai":
+        from agent.embedding_cache import get_embeddings
+        embeddings = get_embeddings()
+    else:
+        embeddings = HashingEmbeddings()
+
+    questions = load_questions(args.questions)
+    results = run_sweep(parse_list(args.chunk_sizes), parse_list(args.overlaps), parse_list(args.k),
+                        questions, embeddings, args.repeat, args.backend)
+    if args.sort == "recall":
+        results.sort(key=lambda row: (-row["recall"], row["prompt_tokens"]))
+    elif args.sort == "tokens":
+        results.sort(key=lambda row: (row["prompt_tokens"], -row["recall"]))
+
+    table = format_markdown(results)
+    print(f"{len(questions)} questions, {args.embeddings} embeddings, {args.backend} search (* = current CHUNK_SIZE/CHUNK_OVERLAP/RETRIEVAL_K)\n")
+    print(table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            if args.output.endswith(".json"):
+                json.dump(results, f, indent=2)
+            else:
+                f.write(table + "\n")
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for OpenAI (chat, embeddings, transcription, speech), ElevenLabs
+and Polly with injectable latency and error rates, so load tests never touch
+(or pay for) the real providers.
+
+    python -m benchmarks.stub_upstreams --port 9100 --latency chat=0.8 --error-rate all=0.05
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1,
+ELEVENLABS_BASE_URL=http://127.0.0.1:9100 and POLLY_ENDPOINT_URL=http://127.0.0.1:9100/polly.
+Latency and error rates can be changed while running via POST /_stub/config.
+"""
+
+import asyncio
+import argparse
+import base64
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+EMBEDDING_DIM = 1536
+
+# Mean latency (seconds) and error rate per upstream
+DEFAULT_PROFILE = {
+    "chat": {"latency": 0.8, "error_rate": 0.0},
+    "embeddings": {"latency": 0.15, "error_rate": 0.0},
+    "transcription": {"latency": 1.0, "error_rate": 0.0},
+    "openai_tts": {"latency": 0.6, "error_rate": 0.0},
+    "elevenlabs": {"latency": 0.7, "error_rate": 0.0},
+    "polly": {"latency": 0.3, "error_rate": 0.0},
+}
+
+STUB_ANSWER = "NextCore AI builds AI automation, web and mobile apps, and cloud solutions for businesses of every size. Would you like more details on any of these services?"
+STUB_GREETING = "{salutation}! Thank you for calling NextCore AI. How can we help you today?"
+STUB_TRANSCRIPT = "What services does NextCore AI offer?"
+
+def silent_mp3(seconds=1.0):
+    """Silent MPEG-1 Layer III at 128 kbps / 44.1 kHz: valid frames with zeroed audio data"""
+    frame = b"\xff\xfb\x90\xc4" + b"\x00" * 413  # 417-byte frames
+    return frame * max(1, int(seconds * 44100 / 1152))
+
+SILENT_MP3 = silent_mp3()
+
+def stub_embedding(item):
+    """Deterministic unit vector for a text or token list, so identical inputs match"""
+    seed = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+    rng = np.random.default_rng(int.from_bytes(seed[:8], "little"))
+    vector = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def parse_overrides(values, field):
+    """["chat=0.5", "all=0.1"] -> {"chat": {field: 0.5}, "all": {field: 0.1}}"""
+    overrides = {}
+    for value in values or []:
+        name, _, number = value.partition("=")
+        overrides.setdefault(name.strip(), {})[field] = float(number)
+    return overrides
+
+def merge_profile(profile, overrides):
+    """Apply {"upstream" | "all": {"latency"?, "error_rate"?}} overrides to a profile"""
+    merged = {name: dict(settings) for name, settings in profile.items()}
+    # "all" first so per-upstream overrides win regardless of order
+    for name, settings in sorted(overrides.items(), key=lambda item: item[0] != "all"):
+        targets = merged.keys() if name == "all" else [name]
+        for target in targets:
+            if target not in merged:
+                raise ValueError(f"Unknown upstream: {target}")
+            merged[target].update(settings)
+    return merged
+
+def create_stub_app(profile=None, error_status=500, seed=None):
+    """FastAPI app emulating every upstream the voice agent calls"""
+    app = FastAPI(title="Voice agent upstream stubs")
+    state = {"profile": merge_profile(DEFAULT_PROFILE, profile or {})}
+    calls = Counter()
+    errors = Counter()
+    rng = random.Random(seed)
+
+    async def simulate(upstream):
+        """Sleep for the upstream's latency (±50% jitter); return an error response if one is injected"""
+        settings = state["profile"][upstream]
+        calls[upstream] += 1
+        await asyncio.sleep(settings["latency"] * rng.uniform(0.5, 1.5))
+        if rng.random() < settings["error_rate"]:
+            errors[upstream] += 1
+            return JSONResponse(
+                {"error": {"message": f"Injected {upstream} failure", "type": "server_error", "code": None}},
+                status_code=error_status
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = await simulate("chat")
+        if error:
+            return error
+        n = body.get("n") or 1
+        # Greeting pool requests ask for several variants at once
+        content = STUB_GREETING if n > 1 else STUB_ANSWER
+        created = int(time.time())
+        if body.get("stream"):
+            async def events():
+                for word in content.split(" "):
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                             "model": body.get("model"), "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                done = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(done)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [
+                {"index": i, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                for i in range(n)
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        error = await simulate("embeddings")
+        if error:
+            return error
+        inputs = body["input"]
+        # A single string, a list of strings, a token list, or a list of token lists
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        vectors = [stub_embedding(item) for item in inputs]
+        if body.get("encoding_format") == "base64":
+            vectors = [base64.b64encode(np.asarray(v, dtype=np.float32).tobytes()).decode("ascii") for v in vectors]
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        await request.body()
+        error = await simulate("transcription")
+        if error:
+            return error
+        return {"text": STUB_TRANSCRIPT}
+
+    @app.post("/v1/audio/speech")
+    async def openai_speech(request: Request):
+        await request.body()
+        error = await simulate("openai_tts")
+        if error:
+            return error
+        return Response(SILENT_MP3, media_type="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def elevenlabs_speech(voice_id: str, request: Request):
+        await request.body()
+        error = await simulate("elevenlabs")
+        if error:
+            return error
+        return Response(SILENT_MP3, media_type="audio/mpeg")
+
+    @app.post("/polly/v1/speech")
+    async def polly_speech(request: Request):
+        body = await request.json()
+        error = await simulate("polly")
+        if error:
+            return error
+        return Response(SILENT_MP3, media_type="audio/mpeg",
+                        headers={"x-amzn-RequestCharacters": str(len(body.get("Text", "")))})
+
+    @app.get("/_stub/config")
+    async def get_config():
+        return state["profile"]
+
+    @app.post("/_stub/config")
+    async def set_config(request: Request):
+        """Merge {"chat": {"latency": 1.2}, "all": {"error_rate": 0.1}} into the running profile"""
+        try:
+            state["profile"] = merge_profile(state["profile"], await request.json())
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return state["profile"]
+
+    @app.get("/_stub/stats")
+    async def stats():
+        return {"calls": dict(calls), "errors": dict(errors)}
+
+    @app.post("/_stub/reset")
+    async def reset():
+        calls.clear()
+        errors.clear()
+        return {"calls": {}, "errors": {}}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI/ElevenLabs/Polly upstreams for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=SECONDS",
+                        help=f"Mean latency override; UPSTREAM is one of {', '.join(DEFAULT_PROFILE)} or all")
+    parser.add_argument("--error-rate", action="append", metavar="UPSTREAM=RATE", help="Share of calls that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures (e.g. 429)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.latency, "latency")
+    for name, settings in parse_overrides(args.error_rate, "error_rate").items():
+        overrides.setdefault(name, {}).update(settings)
+
+    app = create_stub_app(overrides, args.error_status, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,17 @@ Main startup script for production-ready voice agent
 """
 
 import uvicorn
+import argparse
+import asyncio
 import logging
 import sys
 import os
 from pathlib import Path
+from agent.config import (
+    SERVER_MODE, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_KEEPALIVE_TIMEOUT,
+    SERVER_LIMIT_CONCURRENCY, SERVER_BACKLOG, SERVER_GRACEFUL_TIMEOUT,
+    WARM_UP_QUESTION, GREETING_MODE, TTS_PLAYBACK
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -43,7 +50,7 @@ def start_server():
     if not check_requirements():
         sys.exit(1)
     
-    print("🚀 Starting production server...")
+    print("🚀 Starting development server (auto-reload)...")
     print("📞 Exotel webhook: /exotel-voice-webhook") 
     print("� Direct voice: /direct-voice")
     print("📋 API docs: http://localhost:8000/docs")
@@ -67,6 +74,90 @@ def start_server():
         print(f"❌ Error starting server: {e}")
         sys.exit(1)
 
+def worker_count(requested=SERVER_WORKERS):
+    """Worker processes to run: the configured number, or one per CPU core"""
+    return requested if requested > 0 else (os.cpu_count() or 1)
+
+def share_conversation_state(workers):
+    """
+    Per-call conversation state must be visible to every worker, since
+    consecutive turns of one call can land on different processes. Unless a
+    backend was chosen explicitly, multi-worker servers use the SQLite one;
+    spawned workers inherit the environment variable set here.
+    """
+    if workers <= 1:
+        return
+    backend = os.getenv("CONVERSATION_BACKEND")
+    if backend is None:
+        os.environ["CONVERSATION_BACKEND"] = "sqlite"
+        logger.info(f"{workers} workers: sharing conversation state through SQLite (set CONVERSATION_BACKEND to override)")
+    elif backend == "memory":
+        logger.warning(
+            f"CONVERSATION_BACKEND=memory with {workers} workers: each worker keeps its own call state, "
+            "so follow-up turns on another worker lose their history. Use sqlite (one host) or redis."
+        )
+
+def prefork_warm_up():
+    """
+    Prime shared on-disk state once, before any worker starts.
+    Uvicorn spawns (not forks) its workers, so nothing loaded here is inherited
+    in memory; each worker builds its own engine and clients in the app's
+    startup hook before accepting connections. What the parent buys is a
+    validated index, a warm OS page cache, the probe embedding in the
+    embedding cache, and greeting/TTS caches on disk that every worker reads
+    instead of regenerating.
+    """
+    try:
+        from agent.query_agent import warm_up_query_engine
+        engine = warm_up_query_engine(WARM_UP_QUESTION)
+        chunks = len(engine.components["vectorstore"].get(include=[])["ids"])
+        logger.info(f"Pre-fork warm-up: vector index has {chunks} chunks")
+    except Exception as e:
+        logger.warning(f"Pre-fork index warm-up failed, workers will retry: {str(e)}")
+    
+    if GREETING_MODE == "pool":
+        try:
+            from api.greeting_pool import get_greeting_pool
+            asyncio.run(get_greeting_pool().refresh_stale())
+        except Exception as e:
+            logger.warning(f"Pre-fork greeting pool refresh failed: {str(e)}")
+    
+    if TTS_PLAYBACK:
+        try:
+            from api.main import TWILIO_FIXED_PHRASES
+            from api.exotel_webhook import FIXED_PHRASES
+            from voice.text_to_speech import prewarm_tts_cache
+            prewarm_tts_cache(FIXED_PHRASES + TWILIO_FIXED_PHRASES)
+        except Exception as e:
+            logger.warning(f"Pre-fork TTS warm-up failed: {str(e)}")
+
+def start_production_server(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    """
+    Multi-worker server without the file-watcher reloader.
+    On SIGTERM uvicorn stops accepting connections and gives in-flight calls
+    SERVER_GRACEFUL_TIMEOUT seconds to finish before workers exit.
+    """
+    if not check_requirements():
+        sys.exit(1)
+    
+    workers = worker_count(workers)
+    logger.info(f"Starting production server on {host}:{port} with {workers} workers")
+    share_conversation_state(workers)
+    prefork_warm_up()
+    
+    uvicorn.run(
+        "api.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        reload=False,
+        log_level="info",
+        timeout_keep_alive=SERVER_KEEPALIVE_TIMEOUT,
+        limit_concurrency=SERVER_LIMIT_CONCURRENCY or None,
+        backlog=SERVER_BACKLOG,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT
+    )
+
 def print_setup_instructions():
     """Print Exotel setup instructions"""
     
@@ -84,7 +175,20 @@ def print_setup_instructions():
     print("🚨 IMPORTANT: Disable PIN in Exotel dashboard for AI to work!")
     print("=" * 50)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="NextCore AI Voice Agent server")
+    parser.add_argument("--production", action="store_true", default=SERVER_MODE == "production",
+                        help="Run workers without the reloader (or set SERVER_MODE=production)")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker processes, 0 for one per CPU core")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    print_setup_instructions()
-    input("\nPress Enter to start the server...")
-    start_server()
+    args = parse_args()
+    if args.production:
+        start_production_server(args.host, args.port, args.workers)
+    else:
+        print_setup_instructions()
+        input("\nPress Enter to start the server...")
+        start_server()
@@ -0,0 +1,159 @@
+# audio_probe.py
+# Audio duration from container/frame headers, without decoding the audio
+import mmap
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MPEG audio bitrate tables in kbps, indexed by the header's 4-bit bitrate index
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by MPEG version (2.5 is stored as 2.5)
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+_LAYERS = {1: 3, 2: 2, 3: 1}
+
+def wav_duration(data):
+    """Duration of a RIFF/WAVE file from its fmt and data chunk headers"""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    byte_rate = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack_from("<I", data, body + 8)[0]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # Streamed WAVs leave the size unset; use what is actually on disk
+            available = len(data) - body
+            if chunk_size == 0xFFFFFFFF or chunk_size > available:
+                chunk_size = available
+            return chunk_size / byte_rate
+        # Chunks are padded to an even length
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+def parse_mp3_header(data, offset):
+    """
+    Decode the 4-byte MPEG audio frame header at offset.
+    Returns dict(version, layer, bitrate, sample_rate, samples, length, mono) or None.
+    """
+    if offset + 4 > len(data):
+        return None
+    header = struct.unpack_from(">I", data, offset)[0]
+    if header & 0xFFE00000 != 0xFFE00000:
+        return None
+    version = _VERSIONS.get((header >> 19) & 3)
+    layer = _LAYERS.get((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    
+    table_version = 1 if version == 1 else 2
+    bitrate = _BITRATES[(table_version, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    mono = ((header >> 6) & 3) == 3
+    
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    
+    return {"version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+            "samples": samples, "length": length, "mono": mono}
+
+def _id3v2_size(data):
+    """Bytes taken by a leading ID3v2 tag (syncsafe size + optional footer)"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _find_first_frame(data, start, max_scan=64 * 1024):
+    """First offset with two consecutive valid frame headers"""
+    end = min(len(data) - 4, start + max_scan)
+    offset = data.find(b"\xff", start, end)
+    while offset != -1:
+        frame = parse_mp3_header(data, offset)
+        if frame and parse_mp3_header(data, offset + frame["length"]):
+            return offset, frame
+        offset = data.find(b"\xff", offset + 1, end)
+    return None, None
+
+def _vbr_frame_count(data, offset, frame):
+    """Frame count from a Xing/Info or VBRI tag in the first frame, if present"""
+    if frame["layer"] == 3:
+        if frame["version"] == 1:
+            side_info = 17 if frame["mono"] else 32
+        else:
+            side_info = 9 if frame["mono"] else 17
+        xing = offset + 4 + side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack_from(">I", data, xing + 4)[0]
+            if flags & 1:
+                return struct.unpack_from(">I", data, xing + 8)[0]
+    vbri = offset + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI":
+        return struct.unpack_from(">I", data, vbri + 14)[0]
+    return None
+
+def mp3_duration(data):
+    """
+    Duration of an MP3 from frame headers.
+    Uses the Xing/Info/VBRI frame count when present, otherwise walks the
+    frame headers (reading 4 bytes per frame, never decoding audio).
+    """
+    start = _id3v2_size(data)
+    offset, frame = _find_first_frame(data, start)
+    if frame is None:
+        return None
+    sample_rate = frame["sample_rate"]
+    
+    frames = _vbr_frame_count(data, offset, frame)
+    if frames:
+        return frames * frame["samples"] / sample_rate
+    
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    total_samples = 0
+    while offset < end:
+        frame = parse_mp3_header(data, offset)
+        if frame is None or frame["length"] <= 0:
+            break
+        total_samples += frame["samples"]
+        offset += frame["length"]
+    return total_samples / sample_rate
+
+def probe_duration(file_path):
+    """Duration in seconds from headers for WAV/MP3, or None for other formats"""
+    with open(file_path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # Empty file
+        try:
+            if data[:4] == b"RIFF":
+                return wav_duration(data)
+            if data[:3] == b"ID3" or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+                return mp3_duration(data)
+            return None
+        finally:
+            data.close()
@@ -1,24 +1,34 @@
 # audio_utils.py
-import requests
 import os
+import io
+import time
+import wave
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from urllib.parse import urlparse
 from pydub import AudioSegment
 import uuid
 import logging
+from agent.config import (
+    TEMP_AUDIO_DIR, TEMP_AUDIO_MAX_AGE, TEMP_AUDIO_SWEEP_INTERVAL,
+    STT_SAMPLE_RATE, STT_UPLOAD_FORMAT, STT_UPLOAD_BITRATE, STT_MIN_TRIM_SECONDS,
+    VAD_FRAME_MS, VAD_THRESHOLD_DB, VAD_PADDING_MS
+)
+from voice.http_clients import get_http_session, provider_timeout
+from voice.audio_probe import probe_duration
 
 logger = logging.getLogger(__name__)
 
-def download_audio(url, save_dir="temp_audio"):
-    """Download audio from URL and save to local file"""
+def download_audio_bytes(url):
+    """Download audio from URL into memory"""
     try:
-        os.makedirs(save_dir, exist_ok=True)
-        response = requests.get(url, timeout=30)
+        response = get_http_session("audio_download").get(url, timeout=provider_timeout("audio_download"))
         if response.status_code == 200:
-            filename = f"{uuid.uuid4()}.mp3"
-            filepath = os.path.join(save_dir, filename)
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            logger.info(f"Downloaded audio to {filepath}")
-            return filepath
+            logger.info(f"Downloaded {len(response.content)} bytes of audio")
+            return response.content
         else:
             logger.error(f"Failed to download audio: HTTP {response.status_code}")
             raise Exception(f"Failed to download audio: HTTP {response.status_code}")
@@ -26,12 +36,137 @@ def download_audio(url, save_dir="temp_audio"):
         logger.error(f"Error downloading audio: {str(e)}")
         raise
 
+def audio_format_from_url(url, default="mp3"):
+    """Guess the container format from a recording URL's extension"""
+    extension = os.path.splitext(urlparse(url).path)[1].lstrip(".").lower()
+    return extension or default
+
+def transcode_audio_bytes(data, input_format="mp3", output_format="wav", output_args=(), input_args=()):
+    """
+    Transcode audio in memory by piping it through ffmpeg
+    input_args/output_args carry extra options such as ("-ac", "1", "-ar", "16000")
+    """
+    try:
+        result = subprocess.run(
+            [AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+             "-f", input_format, *input_args, "-i", "pipe:0", *output_args, "-f", output_format, "pipe:1"],
+            input=data,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error transcoding audio: {e.stderr.decode(errors='ignore').strip()}")
+        raise
+    except Exception as e:
+        logger.error(f"Error transcoding audio: {str(e)}")
+        raise
+
+def decode_to_pcm(data, input_format="mp3", sample_rate=STT_SAMPLE_RATE):
+    """Decode audio to mono 16-bit PCM samples at sample_rate (ffmpeg downmixes and resamples)"""
+    pcm = transcode_audio_bytes(data, input_format, "s16le", ("-ac", "1", "-ar", str(sample_rate)))
+    return np.frombuffer(pcm, dtype=np.int16)
+
+def pcm_to_wav_bytes(samples, sample_rate=STT_SAMPLE_RATE):
+    """Wrap mono 16-bit PCM samples in a WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+def detect_speech_bounds(samples, sample_rate=STT_SAMPLE_RATE, frame_ms=VAD_FRAME_MS,
+                         threshold_db=VAD_THRESHOLD_DB, padding_ms=VAD_PADDING_MS):
+    """
+    Energy-based VAD: return (start, end) sample indices of the speech region.
+    Frame RMS levels are computed in one vectorized pass; leading and trailing
+    frames below threshold_db (dBFS) are treated as silence. Returns the full
+    range when no frame crosses the threshold.
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return 0, len(samples)
+    
+    frames = samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    levels_db = 20.0 * np.log10(rms + 1e-10)
+    voiced = np.flatnonzero(levels_db > threshold_db)
+    if voiced.size == 0:
+        return 0, len(samples)
+    
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, voiced[0] * frame_len - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_len + padding)
+    return start, end
+
+def preprocess_for_stt(data, input_format="mp3", sample_rate=STT_SAMPLE_RATE, output_format=STT_UPLOAD_FORMAT):
+    """
+    Trim leading/trailing silence, downmix to mono and resample before upload.
+    Returns (audio bytes, format, stats). The speech is re-encoded at a low
+    speech bitrate; trimmed audio is always uploaded because transcription is
+    billed by duration. The original is kept only when there was nothing
+    worth trimming and re-encoding would not make it smaller.
+    """
+    samples = decode_to_pcm(data, input_format, sample_rate)
+    start, end = detect_speech_bounds(samples, sample_rate)
+    trimmed = samples[start:end]
+    
+    stats = {
+        "input_bytes": len(data),
+        "output_bytes": len(data),
+        "original_seconds": len(samples) / sample_rate,
+        "trimmed_seconds": len(trimmed) / sample_rate,
+        "bytes_delta": 0,  # output minus input; negative when the upload shrank
+    }
+    stats["seconds_removed"] = stats["original_seconds"] - stats["trimmed_seconds"]
+    trimmed_enough = stats["seconds_removed"] >= STT_MIN_TRIM_SECONDS
+    
+    # Compressed input with no silence to cut: skip the encode entirely
+    if not trimmed_enough and input_format not in ("wav", "flac"):
+        return data, input_format, stats
+    
+    if output_format == "wav":
+        processed = pcm_to_wav_bytes(trimmed, sample_rate)
+    else:
+        processed = transcode_audio_bytes(
+            trimmed.tobytes(), "s16le", output_format,
+            output_args=("-b:a", STT_UPLOAD_BITRATE),
+            input_args=("-ac", "1", "-ar", str(sample_rate))
+        )
+    
+    if not trimmed_enough and len(processed) >= len(data):
+        return data, input_format, stats
+    
+    stats["output_bytes"] = len(processed)
+    stats["bytes_delta"] = len(processed) - len(data)
+    logger.info(
+        f"STT preprocessing removed {stats['seconds_removed']:.2f}s of silence, "
+        f"upload {len(data)} -> {len(processed)} bytes ({stats['bytes_delta']:+d})"
+    )
+    return processed, output_format, stats
+
+def download_audio(url, save_dir=TEMP_AUDIO_DIR):
+    """Download audio from URL and save to local file"""
+    data = download_audio_bytes(url)
+    os.makedirs(save_dir, exist_ok=True)
+    filepath = os.path.join(save_dir, f"{uuid.uuid4()}.mp3")
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    logger.info(f"Downloaded audio to {filepath}")
+    return filepath
+
 def convert_mp3_to_wav(mp3_path):
     """Convert MP3 file to WAV format"""
     try:
         wav_path = mp3_path.replace(".mp3", ".wav")
-        audio = AudioSegment.from_mp3(mp3_path)
-        audio.export(wav_path, format="wav")
+        with open(mp3_path, "rb") as f:
+            wav_data = transcode_audio_bytes(f.read(), "mp3", "wav")
+        with open(wav_path, "wb") as f:
+            f.write(wav_data)
         logger.info(f"Converted {mp3_path} to {wav_path}")
         return wav_path
     except Exception as e:
@@ -48,22 +183,79 @@ def convert_audio_format(input_path, output_path, output_format="wav"):
         logger.error(f"Error converting audio format: {str(e)}")
         raise
 
-def clean_temp_audio(save_dir="temp_audio"):
-    """Clean up temporary audio files"""
+def clean_temp_audio(save_dir=TEMP_AUDIO_DIR, max_age=TEMP_AUDIO_MAX_AGE):
+    """
+    Clean up temporary audio files and directories older than max_age seconds.
+    Anything newer may belong to an in-flight request and is left alone.
+    """
+    removed = 0
     try:
         if os.path.exists(save_dir):
-            for file in os.listdir(save_dir):
-                file_path = os.path.join(save_dir, file)
-                os.remove(file_path)
-            logger.info(f"Cleaned up temporary files in {save_dir}")
+            cutoff = time.time() - max_age
+            for entry in os.scandir(save_dir):
+                try:
+                    if entry.stat().st_mtime > cutoff:
+                        continue
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue  # Removed by its owner in the meantime
+            if removed:
+                logger.info(f"Cleaned up {removed} stale temporary entries in {save_dir}")
     except Exception as e:
         logger.error(f"Error cleaning temp audio: {str(e)}")
+    return removed
+
+_janitor = None
+_janitor_stop = threading.Event()
+
+def start_temp_audio_janitor(save_dir=TEMP_AUDIO_DIR, interval=TEMP_AUDIO_SWEEP_INTERVAL, max_age=TEMP_AUDIO_MAX_AGE):
+    """Start a background thread that sweeps stale temp audio every interval seconds"""
+    global _janitor
+    if _janitor is not None and _janitor.is_alive():
+        return _janitor
+    
+    def sweep():
+        while not _janitor_stop.wait(interval):
+            clean_temp_audio(save_dir, max_age)
+    
+    _janitor_stop.clear()
+    _janitor = threading.Thread(target=sweep, name="temp-audio-janitor", daemon=True)
+    _janitor.start()
+    return _janitor
+
+def stop_temp_audio_janitor():
+    """Stop the background sweeper"""
+    _janitor_stop.set()
 
 def get_audio_duration(file_path):
-    """Get duration of audio file in seconds"""
+    """
+    Get duration of audio file in seconds
+    WAV and MP3 are measured from headers; other formats are decoded
+    """
+    try:
+        duration = probe_duration(file_path)
+        if duration is not None:
+            return duration
+    except Exception as e:
+        logger.warning(f"Header probe failed for {file_path}, decoding instead: {str(e)}")
     try:
         audio = AudioSegment.from_file(file_path)
         return len(audio) / 1000.0  # Convert milliseconds to seconds
     except Exception as e:
         logger.error(f"Error getting audio duration: {str(e)}")
         return 0
+
+def get_audio_durations(directory, max_workers=8, extensions=(".mp3", ".wav", ".m4a", ".ogg", ".flac", ".webm")):
+    """Measure every recording under a directory in parallel, returning {path: seconds}"""
+    paths = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files
+        if name.lower().endswith(extensions)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(get_audio_duration, paths)))
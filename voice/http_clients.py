@@ -0,0 +1,113 @@
+# http_clients.py
+# Shared, pooled clients for every outbound provider (audio downloads, ElevenLabs, Polly, OpenAI)
+import threading
+import logging
+import requests
+import httpx
+import boto3
+from botocore.config import Config as BotoConfig
+from requests.adapters import HTTPAdapter
+from openai import OpenAI, AsyncOpenAI
+from agent.config import OPENAI_API_KEY, HTTP_TIMEOUTS, HTTP_POOL_SIZE, HTTP_KEEPALIVE_EXPIRY, POLLY_ENDPOINT_URL
+import os
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sessions = {}
+_async_clients = {}
+_polly_client = None
+_openai_client = None
+_async_openai_client = None
+
+def provider_timeout(provider):
+    """Request timeout in seconds for a provider"""
+    return HTTP_TIMEOUTS.get(provider, HTTP_TIMEOUTS["default"])
+
+def _httpx_limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+def get_http_session(provider="default"):
+    """Keep-alive requests session for a provider, shared across threads"""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[provider] = session
+    return session
+
+def get_async_http_client(provider="default"):
+    """Keep-alive httpx.AsyncClient for a provider"""
+    client = _async_clients.get(provider)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(provider)
+            if client is None:
+                client = httpx.AsyncClient(timeout=provider_timeout(provider), limits=_httpx_limits())
+                _async_clients[provider] = client
+    return client
+
+def get_polly_client():
+    """Reused boto3 Polly client (boto3 clients are thread-safe)"""
+    global _polly_client
+    if _polly_client is None:
+        with _lock:
+            if _polly_client is None:
+                _polly_client = boto3.client(
+                    'polly',
+                    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                    region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                    endpoint_url=POLLY_ENDPOINT_URL,
+                    config=BotoConfig(
+                        max_pool_connections=HTTP_POOL_SIZE,
+                        connect_timeout=provider_timeout("polly"),
+                        read_timeout=provider_timeout("polly")
+                    )
+                )
+    return _polly_client
+
+def get_openai_client():
+    """Shared synchronous OpenAI client with a pooled HTTP transport"""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    timeout=provider_timeout("openai"),
+                    http_client=httpx.Client(timeout=provider_timeout("openai"), limits=_httpx_limits())
+                )
+    return _openai_client
+
+def get_async_openai_client():
+    """Shared AsyncOpenAI client with a pooled HTTP transport"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        with _lock:
+            if _async_openai_client is None:
+                _async_openai_client = AsyncOpenAI(
+                    api_key=OPENAI_API_KEY,
+                    timeout=provider_timeout("openai"),
+                    http_client=httpx.AsyncClient(timeout=provider_timeout("openai"), limits=_httpx_limits())
+                )
+    return _async_openai_client
+
+async def close_async_clients():
+    """Close async connection pools on shutdown; the next getter call builds fresh ones"""
+    global _async_openai_client
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+    client, _async_openai_client = _async_openai_client, None
+    if client is not None:
+        await client.close()
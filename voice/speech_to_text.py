@@ -1,14 +1,50 @@
 # speech_to_text.py
-import openai
 import os
-from agent.config import OPENAI_API_KEY
-from voice.audio_utils import download_audio, convert_mp3_to_wav, clean_temp_audio
+import asyncio
+from agent.config import STT_INPUT_FORMATS, STT_PREPROCESS
+from voice.audio_utils import download_audio_bytes, audio_format_from_url, transcode_audio_bytes, preprocess_for_stt
+from voice.http_clients import get_openai_client, get_async_http_client
+from voice.stt_service import get_stt_service
+from agent.circuit_breaker import get_breaker
+from agent.metrics import stage_timer
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Set OpenAI API key
-openai.api_key = OPENAI_API_KEY
+def transcribe_audio_bytes(audio_data, filename="audio.mp3"):
+    """
+    Transcribe in-memory audio using OpenAI Whisper API
+    The filename extension tells Whisper the container format
+    """
+    try:
+        with stage_timer("stt"), get_breaker("stt").guard():
+            transcript = get_openai_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, audio_data)
+            )
+        return transcript.text
+    except Exception as e:
+        logger.error(f"Error transcribing audio: {str(e)}")
+        return None
+
+def prepare_audio_for_upload(audio_data, audio_format):
+    """
+    Return (audio bytes, format) ready for Whisper
+    Silence is trimmed and audio downsampled when STT_PREPROCESS is on;
+    otherwise only formats Whisper can't read are transcoded
+    """
+    if STT_PREPROCESS:
+        try:
+            audio_data, audio_format, _ = preprocess_for_stt(audio_data, audio_format)
+            return audio_data, audio_format
+        except Exception as e:
+            logger.warning(f"STT preprocessing failed, sending original audio: {str(e)}")
+    
+    # Whisper accepts MP3/WAV/etc. directly; only transcode formats it can't read
+    if audio_format not in STT_INPUT_FORMATS:
+        audio_data = transcode_audio_bytes(audio_data, audio_format, "wav")
+        audio_format = "wav"
+    return audio_data, audio_format
 
 def transcribe_audio_file(audio_file_path):
     """
@@ -16,11 +52,11 @@ def transcribe_audio_file(audio_file_path):
     """
     try:
         with open(audio_file_path, "rb") as audio_file:
-            transcript = openai.Audio.transcribe("whisper-1", audio_file)
-        return transcript["text"]
+            audio_data = audio_file.read()
     except Exception as e:
-        logger.error(f"Error transcribing audio: {str(e)}")
+        logger.error(f"Error reading audio file: {str(e)}")
         return None
+    return transcribe_audio_bytes(audio_data, os.path.basename(audio_file_path))
 
 def speech_to_text(audio_path):
     """Legacy function for backward compatibility"""
@@ -28,22 +64,43 @@ def speech_to_text(audio_path):
 
 def transcribe_from_url(audio_url):
     """
-    Download audio from URL and transcribe it
+    Download audio from URL and transcribe it without touching disk
     """
     try:
-        # Download audio
-        mp3_path = download_audio(audio_url)
-        
-        # Convert to WAV if needed
-        wav_path = convert_mp3_to_wav(mp3_path)
+        with stage_timer("audio_download"):
+            audio_data = download_audio_bytes(audio_url)
+        with stage_timer("audio_prepare"):
+            audio_data, audio_format = prepare_audio_for_upload(audio_data, audio_format_from_url(audio_url))
         
-        # Transcribe
-        transcript = transcribe_audio_file(wav_path)
-        
-        # Clean up temporary files
-        clean_temp_audio()
+        return transcribe_audio_bytes(audio_data, f"audio.{audio_format}")
+    except Exception as e:
+        logger.error(f"Error processing audio from URL: {str(e)}")
+        return None
+
+async def atranscribe_audio_bytes(audio_data, filename="audio.mp3"):
+    """
+    Transcribe in-memory audio through the bounded async STT service
+    Raises STTQueueFull when the service is saturated
+    The "stt" stage includes time spent queued behind other calls
+    """
+    with stage_timer("stt"):
+        return await get_stt_service().transcribe(audio_data, filename)
+
+async def atranscribe_from_url(audio_url):
+    """
+    Async download + transcription that never blocks the event loop
+    """
+    try:
+        with stage_timer("audio_download"):
+            response = await get_async_http_client("audio_download").get(audio_url)
+            response.raise_for_status()
+        # ffmpeg work runs in the executor so the event loop stays free
+        with stage_timer("audio_prepare"):
+            audio_data, audio_format = await asyncio.get_running_loop().run_in_executor(
+                None, prepare_audio_for_upload, response.content, audio_format_from_url(audio_url)
+            )
         
-        return transcript
+        return await atranscribe_audio_bytes(audio_data, f"audio.{audio_format}")
     except Exception as e:
         logger.error(f"Error processing audio from URL: {str(e)}")
         return None
@@ -0,0 +1,102 @@
+# streaming_tts.py
+# Speaks an answer sentence by sentence while the LLM is still writing it
+import re
+import time
+import asyncio
+import logging
+from agent.config import TTS_BACKEND
+from voice.text_to_speech import stream_text_to_speech
+
+logger = logging.getLogger(__name__)
+
+# End of sentence: terminal punctuation, optional closing quote/bracket, then whitespace
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+class SentenceSplitter:
+    """
+    Incrementally cut a stream of token deltas at sentence boundaries.
+    Very short fragments ("Mr.", "Yes.") are held back and joined with the
+    next sentence so each TTS request carries a natural phrase.
+    """
+
+    def __init__(self, min_chars=20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta):
+        """Add a delta and return the sentences it completed"""
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever is left once the stream ends"""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return [remainder] if remainder else []
+
+async def synthesize_stream(deltas, backend=TTS_BACKEND):
+    """
+    Consume an async iterator of text deltas and yield (sentence, audio_path)
+    in order. Each sentence is sent to TTS in the default executor as soon as
+    it is complete, so synthesis overlaps with the rest of the completion.
+    Clips bypass the shared TTS cache: answer sentences are rarely repeated
+    and would only push out the fixed-prompt clips.
+    audio_path is None when synthesis of that sentence failed.
+    """
+    loop = asyncio.get_running_loop()
+    splitter = SentenceSplitter()
+    pending = asyncio.Queue()
+    
+    def schedule(sentence):
+        task = loop.run_in_executor(None, stream_text_to_speech, sentence, backend)
+        pending.put_nowait((sentence, task))
+    
+    async def produce():
+        try:
+            async for delta in deltas:
+                for sentence in splitter.feed(delta):
+                    schedule(sentence)
+            for sentence in splitter.flush():
+                schedule(sentence)
+        finally:
+            pending.put_nowait(None)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            sentence, task = item
+            yield sentence, await task
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+async def speak_phone_answer(question, caller_number="Unknown", backend=TTS_BACKEND, call_sid=None, raise_errors=False):
+    """
+    Stream a phone answer from the knowledge base straight into TTS.
+    Yields (sentence, audio_path) pairs; logs time to first audio and total time.
+    With raise_errors, a failure before the first sentence is raised instead of spoken as an apology.
+    """
+    from agent.query_agent import astream_phone_answer
+    
+    started = time.perf_counter()
+    first_audio = None
+    count = 0
+    async for sentence, audio_path in synthesize_stream(astream_phone_answer(question, caller_number, call_sid=call_sid, raise_errors=raise_errors), backend):
+        if first_audio is None:
+            first_audio = time.perf_counter() - started
+            logger.info(f"First audio ready after {first_audio:.2f}s")
+        count += 1
+        yield sentence, audio_path
+    logger.info(f"Spoke {count} sentences in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,188 @@
+# stt_service.py
+# Async speech-to-text with bounded concurrency, a backpressured queue and retries
+import asyncio
+import random
+from abc import ABC, abstractmethod
+import logging
+import numpy as np
+from agent.config import (
+    STT_BACKEND, STT_MAX_CONCURRENCY, STT_MAX_QUEUE, STT_MAX_RETRIES,
+    STT_RETRY_BASE_DELAY, LOCAL_WHISPER_MODEL
+)
+from agent.batch_embedder import is_rate_limit_error
+from agent.circuit_breaker import get_breaker
+from voice.audio_utils import transcode_audio_bytes
+from voice.http_clients import get_async_openai_client
+
+logger = logging.getLogger(__name__)
+
+class STTQueueFull(Exception):
+    """Raised when the transcription queue is full and the caller should degrade"""
+
+class STTBackend(ABC):
+    """Interface for speech-to-text backends"""
+    name = "base"
+
+    @abstractmethod
+    async def transcribe(self, audio_data, filename="audio.mp3"):
+        """Return the transcript for in-memory audio; filename carries the format"""
+
+class OpenAIWhisperBackend(STTBackend):
+    """Hosted Whisper via the shared AsyncOpenAI client"""
+    name = "openai"
+
+    def __init__(self, model="whisper-1"):
+        self.model = model
+
+    async def transcribe(self, audio_data, filename="audio.mp3"):
+        transcript = await get_async_openai_client().audio.transcriptions.create(
+            model=self.model,
+            file=(filename, audio_data)
+        )
+        return transcript.text
+
+class LocalWhisperBackend(STTBackend):
+    """
+    Offline Whisper model (pip install openai-whisper) for tests and cost/latency
+    comparison. Inference is CPU/GPU bound, so it runs in the default executor.
+    """
+    name = "local"
+
+    def __init__(self, model_name=LOCAL_WHISPER_MODEL):
+        try:
+            import whisper
+        except ImportError:
+            raise RuntimeError("Local STT backend requires the openai-whisper package")
+        self.model = whisper.load_model(model_name)
+
+    def _transcribe_sync(self, audio_data, filename):
+        audio_format = filename.rsplit(".", 1)[-1].lower()
+        # Whisper expects 16 kHz mono float32 samples
+        pcm = transcode_audio_bytes(audio_data, audio_format, "s16le", ("-ac", "1", "-ar", "16000"))
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        return self.model.transcribe(samples)["text"].strip()
+
+    async def transcribe(self, audio_data, filename="audio.mp3"):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._transcribe_sync, audio_data, filename)
+
+def create_stt_backend(name=STT_BACKEND):
+    """Build the configured backend ("openai" or "local")"""
+    if name == "openai":
+        return OpenAIWhisperBackend()
+    if name == "local":
+        return LocalWhisperBackend()
+    raise ValueError(f"Unknown STT backend: {name}")
+
+class STTService:
+    """
+    Transcription requests go into a bounded queue served by max_concurrency
+    worker tasks. When the queue is full, transcribe() raises STTQueueFull
+    immediately instead of letting latency grow without bound.
+    """
+
+    def __init__(self, backend, max_concurrency=STT_MAX_CONCURRENCY, max_queue=STT_MAX_QUEUE,
+                 max_retries=STT_MAX_RETRIES, base_delay=STT_RETRY_BASE_DELAY):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+        self._loop = None
+        self._queue = None
+        self._workers = []
+
+    def _ensure_workers(self):
+        """Start the queue and workers on the running event loop, retiring any left on another loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._retire, self._workers, self._queue)
+            except RuntimeError:
+                pass  # Closed in the meantime; its tasks are gone with it
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [loop.create_task(self._worker(self._queue)) for _ in range(self.max_concurrency)]
+
+    @staticmethod
+    def _retire(workers, queue):
+        """Cancel a previous loop's workers and fail whatever was still queued for them (runs on that loop)"""
+        for worker in workers:
+            worker.cancel()
+        while not queue.empty():
+            _, _, future = queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("STT service moved to another event loop"))
+
+    async def _worker(self, queue):
+        while True:
+            audio_data, filename, future = await queue.get()
+            try:
+                if not future.cancelled():
+                    result = await self._transcribe_with_retry(audio_data, filename)
+                    if not future.cancelled():
+                        future.set_result(result)
+                    self.completed += 1
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _transcribe_with_retry(self, audio_data, filename):
+        attempt = 0
+        while True:
+            try:
+                with get_breaker("stt").guard():
+                    return await self.backend.transcribe(audio_data, filename)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    raise
+                # Full jitter keeps concurrent retries from synchronizing
+                delay = random.uniform(0, self.base_delay * (2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"STT rate limited, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def transcribe(self, audio_data, filename="audio.mp3"):
+        """Queue audio for transcription and wait for the transcript"""
+        self._ensure_workers()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((audio_data, filename, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise STTQueueFull(f"STT queue full ({self.max_queue} waiting)")
+        return await future
+
+    def stats(self):
+        """Queue depth and outcome counters"""
+        return {
+            "backend": self.backend.name,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
+
+_service = None
+
+def get_stt_service():
+    """Return the process-wide STT service for the configured backend"""
+    global _service
+    if _service is None:
+        _service = STTService(create_stt_backend())
+    return _service
@@ -1,19 +1,31 @@
 # text_to_speech.py
-import requests
 import os
-import boto3
+import re
+import json
+import uuid
+import hashlib
+import threading
 from agent.config import *
+from voice.http_clients import get_http_session, get_polly_client, get_openai_client, provider_timeout
+from agent.circuit_breaker import get_breaker
+from agent.metrics import stage_timer
 import logging
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+# Voice settings per backend; part of the TTS cache key
+ELEVENLABS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.5}
+OPENAI_TTS_MODEL = "tts-1"
+OPENAI_TTS_VOICE = "alloy"
+POLLY_VOICE_ID = "Joanna"
+
 def text_to_speech_elevenlabs(text, output_path="data/recordings/output.mp3"):
     """Convert text to speech using ElevenLabs API"""
     try:
         API_KEY = os.getenv("ELEVENLABS_API_KEY")
         voice_id = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # Default voice
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        url = f"{ELEVENLABS_BASE_URL.rstrip('/')}/v1/text-to-speech/{voice_id}"
 
         headers = {
             "xi-api-key": API_KEY,
@@ -21,10 +33,12 @@ def text_to_speech_elevenlabs(text, output_path="data/recordings/output.mp3"):
         }
         body = {
             "text": text,
-            "voice_settings": {"stability": 0.5, "similarity_boost": 0.5}
+            "voice_settings": ELEVENLABS_VOICE_SETTINGS
         }
 
-        response = requests.post(url, json=body, headers=headers)
+        response = get_http_session("elevenlabs").post(
+            url, json=body, headers=headers, timeout=provider_timeout("elevenlabs")
+        )
         if response.status_code == 200:
             with open(output_path, "wb") as f:
                 f.write(response.content)
@@ -36,17 +50,10 @@ def text_to_speech_elevenlabs(text, output_path="data/recordings/output.mp3"):
         logger.error(f"Error with ElevenLabs TTS: {str(e)}")
         return None
 
-def text_to_speech_polly(text, voice_id='Joanna', output_format='mp3'):
+def text_to_speech_polly(text, voice_id=POLLY_VOICE_ID, output_format='mp3'):
     """Convert text to speech using Amazon Polly"""
     try:
-        polly_client = boto3.client(
-            'polly',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
-        
-        response = polly_client.synthesize_speech(
+        response = get_polly_client().synthesize_speech(
             Text=text,
             OutputFormat=output_format,
             VoiceId=voice_id
@@ -58,14 +65,11 @@ def text_to_speech_polly(text, voice_id='Joanna', output_format='mp3'):
         logger.error(f"Error with Polly TTS: {str(e)}")
         return None
 
-def text_to_speech_openai(text, voice='alloy', output_path=None):
+def text_to_speech_openai(text, voice=OPENAI_TTS_VOICE, output_path=None):
     """Convert text to speech using OpenAI TTS API"""
     try:
-        import openai
-        openai.api_key = OPENAI_API_KEY
-        
-        response = openai.audio.speech.create(
-            model="tts-1",
+        response = get_openai_client().audio.speech.create(
+            model=OPENAI_TTS_MODEL,
             voice=voice,
             input=text
         )
@@ -80,11 +84,220 @@ def text_to_speech_openai(text, voice='alloy', output_path=None):
         logger.error(f"Error with OpenAI TTS: {str(e)}")
         return None
 
-# Default function for backward compatibility
-def text_to_speech(text, output_path="data/recordings/output.mp3"):
-    """Default TTS function - tries ElevenLabs first, falls back to OpenAI"""
-    result = text_to_speech_elevenlabs(text, output_path)
-    if result is None:
-        logger.info("ElevenLabs failed, trying OpenAI TTS...")
+def _synthesize_with(backend, text, output_path):
+    """Run one backend, returning the output path or None on failure"""
+    if backend == "elevenlabs":
+        return text_to_speech_elevenlabs(text, output_path)
+    if backend == "openai":
         return text_to_speech_openai(text, output_path=output_path)
+    audio = text_to_speech_polly(text)
+    if audio is None:
+        return None
+    with open(output_path, "wb") as f:
+        f.write(audio)
+    return output_path
+
+def _guarded_synthesis(backend, text, output_path):
+    """
+    Synthesize behind the backend's circuit breaker
+    Backends report failure as None, so None counts as a failed call;
+    an open breaker returns None without touching the network
+    """
+    breaker = get_breaker(f"tts.{backend}")
+    if not breaker.allow():
+        logger.warning(f"TTS backend {backend} circuit is open, skipping")
+        return None
+    try:
+        with stage_timer(f"tts_{backend}"):
+            result = _synthesize_with(backend, text, output_path)
+    except Exception:
+        breaker.record_failure()
+        raise
+    if result is None:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
     return result
+
+def text_to_speech_to_file(text, output_path, backend=TTS_BACKEND):
+    """Synthesize text into output_path with the chosen backend ("auto", "elevenlabs", "openai" or "polly")"""
+    if backend == "auto":
+        result = _guarded_synthesis("elevenlabs", text, output_path)
+        if result is None:
+            logger.info("ElevenLabs failed, trying OpenAI TTS...")
+            return _guarded_synthesis("openai", text, output_path)
+        return result
+    if backend in ("elevenlabs", "openai", "polly"):
+        return _guarded_synthesis(backend, text, output_path)
+    logger.error(f"Unknown TTS backend: {backend}")
+    return None
+
+# ---------------------------------------------------------------------------
+# Content-addressed TTS cache
+# ---------------------------------------------------------------------------
+
+_cache_lock = threading.Lock()
+_CACHE_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def _voice_settings(backend):
+    """Voice and settings that determine the audio a backend produces"""
+    if backend == "elevenlabs":
+        return os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM"), ELEVENLABS_VOICE_SETTINGS
+    if backend == "openai":
+        return OPENAI_TTS_VOICE, {"model": OPENAI_TTS_MODEL}
+    if backend == "polly":
+        return POLLY_VOICE_ID, {"format": "mp3"}
+    raise ValueError(f"Unknown TTS backend: {backend}")
+
+def tts_cache_key(text, backend):
+    """Stable key for (backend, voice, settings, text)"""
+    voice, settings = _voice_settings(backend)
+    payload = json.dumps(
+        {"backend": backend, "voice": voice, "settings": settings,
+         "text": hashlib.sha256(text.encode("utf-8")).hexdigest()},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def tts_cache_path(key, cache_dir=TTS_CACHE_DIR):
+    """On-disk location of a cached clip; keys are validated so they can come from URLs"""
+    if not _CACHE_KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid TTS cache key: {key}")
+    return os.path.join(cache_dir, f"{key}.mp3")
+
+def _resolve_backends(backend):
+    return ["elevenlabs", "openai"] if backend == "auto" else [backend]
+
+def find_cached_speech(text, backend=TTS_BACKEND, cache_dir=TTS_CACHE_DIR):
+    """Return the cached clip path for text without synthesizing, or None"""
+    for name in _resolve_backends(backend):
+        path = tts_cache_path(tts_cache_key(text, name), cache_dir)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Mark as recently used for LRU eviction
+            except OSError:
+                continue
+            return path
+    return None
+
+def enforce_tts_cache_limit(cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+    """Evict least recently used clips until the cache fits in max_bytes"""
+    with _cache_lock:
+        try:
+            entries = []
+            for entry in os.scandir(cache_dir):
+                if entry.is_file() and entry.name.endswith(".mp3"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"Evicted {removed} clips from TTS cache")
+        return removed
+
+_cache_stats = {"hits": 0, "misses": 0}
+
+def tts_cache_stats():
+    """Hit/miss counters for cached_text_to_speech"""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+    total = stats["hits"] + stats["misses"]
+    return {**stats, "hit_rate": stats["hits"] / total if total else 0.0}
+
+def cached_text_to_speech(text, backend=TTS_BACKEND, cache_dir=TTS_CACHE_DIR):
+    """Return a path to audio for text, synthesizing and caching it on a miss"""
+    cached = find_cached_speech(text, backend, cache_dir)
+    with _cache_lock:
+        _cache_stats["hits" if cached else "misses"] += 1
+    if cached:
+        return cached
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in _resolve_backends(backend):
+        path = tts_cache_path(tts_cache_key(text, name), cache_dir)
+        # Unique temp file, then an atomic rename, so concurrent misses never clobber each other
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if text_to_speech_to_file(text, tmp_path, name):
+                os.replace(tmp_path, path)
+                enforce_tts_cache_limit(cache_dir)
+                return path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if backend == "auto":
+            logger.info(f"{name} TTS failed, trying next backend...")
+    return None
+
+def prewarm_tts_cache(phrases, backend=TTS_BACKEND):
+    """Synthesize fixed phrases ahead of time so calls never wait for them"""
+    ready = 0
+    for phrase in phrases:
+        if cached_text_to_speech(phrase, backend):
+            ready += 1
+    logger.info(f"TTS cache pre-warmed: {ready}/{len(phrases)} phrases")
+    return ready
+
+def tts_clip_url(path, base_url=PUBLIC_BASE_URL):
+    """Public URL for a cached clip, for Exotel/Twilio <Play>"""
+    key = os.path.splitext(os.path.basename(path))[0]
+    return f"{base_url.rstrip('/')}/tts/{key}.mp3"
+
+def cached_clip_url(text, backend=TTS_BACKEND):
+    """URL of an already-cached clip for text, or None when playback is off or it isn't cached"""
+    if not TTS_PLAYBACK or not PUBLIC_BASE_URL:
+        return None
+    path = find_cached_speech(text, backend)
+    return tts_clip_url(path) if path else None
+
+# ---------------------------------------------------------------------------
+# One-off clips for sentence-streamed answers
+# ---------------------------------------------------------------------------
+
+_STREAM_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def stream_clip_path(key, clip_dir=TEMP_AUDIO_DIR):
+    """On-disk location of a one-off clip; keys are validated so they can come from URLs"""
+    if not _STREAM_KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid stream clip key: {key}")
+    return os.path.join(clip_dir, f"{key}.mp3")
+
+def stream_text_to_speech(text, backend=TTS_BACKEND, clip_dir=TEMP_AUDIO_DIR):
+    """
+    Synthesize one answer sentence outside the TTS cache, so unique answer
+    text never evicts the fixed-prompt clips. The temp audio janitor removes
+    the file by age once the call has played it.
+    """
+    os.makedirs(clip_dir, exist_ok=True)
+    path = stream_clip_path(uuid.uuid4().hex, clip_dir)
+    if text_to_speech_to_file(text, path, backend):
+        return path
+    if os.path.exists(path):
+        os.remove(path)
+    return None
+
+def stream_clip_url(path, base_url=PUBLIC_BASE_URL):
+    """Public URL for a one-off clip, for Exotel/Twilio <Play>"""
+    key = os.path.splitext(os.path.basename(path))[0]
+    return f"{base_url.rstrip('/')}/tts/stream/{key}.mp3"
+
+# Default function for backward compatibility
+def text_to_speech(text, output_path=None):
+    """
+    Default TTS function - tries ElevenLabs first, falls back to OpenAI.
+    Without output_path the clip is served from (and stored in) the TTS cache.
+    """
+    if output_path is None:
+        return cached_text_to_speech(text, "auto")
+    return text_to_speech_to_file(text, output_path, "auto")